@@ -0,0 +1,95 @@
+# Measures the throughput, latency percentiles and peak memory of the TAGIAS helpers against the local mock server:
+#   python benchmarks/bench_client.py --packages 100 --pictures 10000 --shapes 5 --points 8 --calls 50
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tagias.tagias import TagiasHelper, TagiasHelper2
+from mock_server import MockTagiasServer
+
+
+# Returns the p-th percentile of the sorted values
+def percentile(values, p):
+    index = min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))
+    return values[index]
+
+
+# Calls fn the given number of times and returns the latencies in seconds and the peak traced memory of one extra call
+def measure(fn, calls):
+    fn()
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return sorted(latencies), peak
+
+
+# Walks all the converted objects of a TagiasResult, so the lazy conversion is included in the measurement
+def convert_all(result):
+    count = 0
+    for picture in result.pictures:
+        if isinstance(picture.result, list):
+            count += len(list(picture.datalist))
+        else:
+            count += picture.data is not None
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TAGIAS client benchmarks against the local mock server')
+    parser.add_argument('--packages', type=int, default=100)
+    parser.add_argument('--pictures', type=int, default=10000)
+    parser.add_argument('--shapes', type=int, default=5)
+    parser.add_argument('--points', type=int, default=8)
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--bulk', type=int, default=16, help='number of package ids for the bulk methods')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    server = MockTagiasServer(packages=args.packages, pictures=args.pictures, shapes=args.shapes, points=args.points).start()
+    helper = TagiasHelper('benchmark', url=server.url, pool_size=args.workers)
+    helper2 = TagiasHelper2('benchmark', url=server.url, pool_size=args.workers)
+    ids = [str(n) for n in range(args.bulk)]
+    pictures = args.pictures
+
+    scenarios = [
+        ('TagiasHelper.get_packages', 1, lambda: helper.get_packages()),
+        ('TagiasHelper.get_package', 1, lambda: helper.get_package('0')),
+        ('TagiasHelper.get_balance', 1, lambda: helper.get_balance()),
+        ('TagiasHelper.get_result', pictures, lambda: helper.get_result('0')),
+        ('TagiasHelper.iter_result', pictures, lambda: sum(1 for _ in helper.iter_result('0'))),
+        ('TagiasHelper2.get_result (lazy)', pictures, lambda: helper2.get_result('0')),
+        ('TagiasHelper2.get_result + convert', pictures, lambda: convert_all(helper2.get_result('0'))),
+        ('TagiasHelper2.get_packages', 1, lambda: helper2.get_packages()),
+        ('TagiasHelper.get_results_many', pictures * len(ids), lambda: list(helper.get_results_many(ids, args.workers))),
+        ('TagiasHelper.get_packages_details', len(ids), lambda: list(helper.get_packages_details(ids, args.workers))),
+    ]
+
+    print('{} packages, {} pictures per result, {} shapes per picture, {} points per polygon, {} calls per scenario'.format(
+        args.packages, args.pictures, args.shapes, args.points, args.calls))
+    print('{:<38} {:>10} {:>10} {:>10} {:>10} {:>14} {:>10}'.format(
+        'scenario', 'p50, ms', 'p90, ms', 'p99, ms', 'calls/s', 'items/s', 'peak, MB'))
+    for name, items, fn in scenarios:
+        latencies, peak = measure(fn, args.calls)
+        total = sum(latencies)
+        print('{:<38} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.1f} {:>14.0f} {:>10.1f}'.format(
+            name, percentile(latencies, 50) * 1000, percentile(latencies, 90) * 1000, percentile(latencies, 99) * 1000,
+            len(latencies) / total, items * len(latencies) / total, peak / 1024 ** 2))
+
+    helper.close()
+    helper2.close()
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
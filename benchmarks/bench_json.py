@@ -0,0 +1,44 @@
+# Compares the JSON codecs from tagias.codec on synthetic get_result payloads:
+#   python benchmarks/bench_json.py [pictures] [shapes] [points]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tagias.codec import TagiasJsonCodec, TagiasOrjsonCodec, orjson
+from payloads import result_payload
+
+
+# Returns the best time of the repeated calls of fn in seconds
+def best_of(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(pictures=20000, shapes=5, points=8):
+    payload = result_payload(pictures, shapes, points)
+    codecs = [TagiasJsonCodec()]
+    if orjson is not None:
+        codecs.append(TagiasOrjsonCodec())
+    else:
+        print('orjson is not installed, only the standard json codec is measured')
+
+    body = TagiasJsonCodec().dumps(payload)
+    print('Payload: {} pictures, {} shapes per picture, {} points per polygon, {:.1f} MB'.format(
+        pictures, shapes, points, len(body) / 1024 ** 2))
+    print('{:<8} {:>12} {:>12} {:>12} {:>12}'.format('codec', 'dumps, s', 'dumps, MB/s', 'loads, s', 'loads, MB/s'))
+    for codec in codecs:
+        dumps = best_of(lambda: codec.dumps(payload))
+        loads = best_of(lambda: codec.loads(body))
+        size = len(body) / 1024 ** 2
+        print('{:<8} {:>12.3f} {:>12.1f} {:>12.3f} {:>12.1f}'.format(codec.name, dumps, size / dumps, loads, size / loads))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
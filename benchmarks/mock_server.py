@@ -0,0 +1,153 @@
+# Local stand-in for the TAGIAS external API that serves synthetic payloads of configurable size:
+#   python benchmarks/mock_server.py --port 8000 --packages 100 --pictures 10000 --shapes 5 --points 8
+# and then use TagiasHelper(apiKey, url='http://127.0.0.1:8000/api/v2/tagias')
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from payloads import packages_payload, result_payload
+
+
+API_PATH = '/api/v2/tagias'
+
+
+# Request handler that emulates the /packages, /packages/{id}, /packages/result/{id} and /balance endpoints
+class MockTagiasHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are written separately, so Nagle's algorithm would delay every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, status=200, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else b''
+        if not self.headers.get('Authorization', '').startswith('Api-Key '):
+            return self._send(b'', 401)
+        if not self.path.startswith(API_PATH):
+            return self._send(b'', 404)
+
+        path = self.path[len(API_PATH):]
+        failure = self.server.record(self.command, path, data)
+        if failure is not None:
+            return self._send(b'', failure[0], failure[1])
+        bodies = self.server.bodies
+        if path == '/packages':
+            return self._send(bodies['new_package'] if self.command == 'POST' else bodies['packages'])
+        if path.startswith('/packages/result/'):
+            return self._send(bodies['ok'] if self.command == 'POST' else bodies['result'])
+        if path.startswith('/packages/'):
+            return self._send(bodies['ok'] if self.command == 'PATCH' else bodies['package'])
+        if path == '/balance':
+            return self._send(bodies['balance'])
+        return self._send(b'', 404)
+
+    do_GET = _route
+    do_POST = _route
+    do_PATCH = _route
+
+
+# Threaded mock server; the response bodies are serialized once, so the measurements are dominated by the client.
+# The tests can log the served requests and make the next matching requests fail with fail()
+class MockTagiasServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, packages=100, pictures=1000, shapes=5, points=8, log_requests=False):
+        super().__init__((host, port), MockTagiasHandler)
+        # (method, path, body) of every request if log_requests is True, and the pending failures
+        self.requests = [] if log_requests else None
+        self.failures = []
+        self.lock = threading.Lock()
+        package_list = packages_payload(packages)
+        package = dict(package_list['packages'][0], descr='Mark all objects', labels=None, labels_required=None,
+                       callback=None, started='2020-07-01T10:00:00.000Z', stopped=None,
+                       finished='2020-07-02T10:00:00.000Z', updated='2020-07-02T10:00:00.000Z', delivered=None,
+                       baseurl='https://example.com/images/')
+        self.package = package
+        balance = {'status': 'ok', 'balance': 100.5, 'operations': [
+            {'date': '2020-07-{:02d}T10:00:00.000Z'.format(n % 28 + 1), 'amount': -1.5, 'note': 'Package {}'.format(n)}
+            for n in range(packages)]}
+
+        def dump(obj):
+            return json.dumps(obj).encode('utf-8')
+
+        self.bodies = {
+            'ok': dump({'status': 'ok'}),
+            'packages': dump(package_list),
+            'package': dump({'status': 'ok', 'package': package}),
+            'new_package': dump({'status': 'ok', 'id': package['id'], 'pictures_num': pictures}),
+            'result': dump(result_payload(pictures, shapes, points)),
+            'balance': dump(balance),
+        }
+
+    # Makes the next count requests fail with the status code; method, path (a prefix of the path after the API URL)
+    # and contains (a part of the request body) select the failed requests, and retry_after is sent as Retry-After
+    def fail(self, status, count=1, method=None, path=None, contains=None, retry_after=None):
+        headers = () if retry_after is None else (('Retry-After', str(retry_after)),)
+        with self.lock:
+            self.failures.append([count, method, path, contains, status, headers])
+
+    # Logs the request and returns the (status, headers) of its failure, or None if it is not failed
+    def record(self, method, path, data):
+        with self.lock:
+            if self.requests is not None:
+                self.requests.append((method, path, data))
+            for failure in self.failures:
+                count, fail_method, fail_path, contains, status, headers = failure
+                if ((fail_method is None or fail_method == method) and (fail_path is None or path.startswith(fail_path))
+                        and (contains is None or contains.encode('utf-8') in data)):
+                    failure[0] -= 1
+                    if failure[0] <= 0:
+                        self.failures.remove(failure)
+                    return status, headers
+        return None
+
+    # Changes the attributes of the package returned by /packages/{id}
+    def update_package(self, **changes):
+        self.package.update(changes)
+        self.bodies['package'] = json.dumps({'status': 'ok', 'package': self.package}).encode('utf-8')
+
+    # Returns the API endpoint URL of the server
+    @property
+    def url(self):
+        return 'http://{}:{}{}'.format(self.server_address[0], self.server_address[1], API_PATH)
+
+    # Starts serving in a daemon thread
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of the TAGIAS external API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--packages', type=int, default=100)
+    parser.add_argument('--pictures', type=int, default=1000)
+    parser.add_argument('--shapes', type=int, default=5)
+    parser.add_argument('--points', type=int, default=8)
+    args = parser.parse_args()
+    server = MockTagiasServer(args.host, args.port, args.packages, args.pictures, args.shapes, args.points)
+    print('Serving {}'.format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import random
+
+
+# Returns a synthetic get_result response with the given number of pictures, shapes per picture and points per polygon
+def result_payload(pictures=1000, shapes=5, points=8, seed=0):
+    rnd = random.Random(seed)
+    labels = ['dog', 'cat', 'car', 'person', 'bicycle']
+
+    def point():
+        return {'x': round(rnd.uniform(0, 1920), 2), 'y': round(rnd.uniform(0, 1080), 2)}
+
+    def shape(i):
+        kind = i % 4
+        label = rnd.choice(labels)
+        if kind == 0:
+            return {'type': 'BoundingBoxes', 'label': label, 'x': rnd.randint(0, 1800), 'y': rnd.randint(0, 1000),
+                    'width': rnd.randint(1, 120), 'height': rnd.randint(1, 80)}
+        if kind == 1:
+            return {'type': 'Polygons', 'label': label, 'points': [point() for _ in range(points)]}
+        if kind == 2:
+            return {'type': 'Lines', 'label': label, 'points': [point() for _ in range(max(2, points // 2))]}
+        return dict(point(), type='Keypoints', label=label)
+
+    items = []
+    for n in range(pictures):
+        if n % 50 == 49:
+            result = {'error': 'BADIMAGE'}
+        elif n % 10 == 9:
+            result = {'type': 'ClassificationMultiple', 'labels': rnd.sample(labels, 2)}
+        else:
+            result = [shape(i) for i in range(shapes)]
+        items.append({'name': 'image.{:07d}.jpg'.format(n), 'result': result})
+    return {'status': 'ok', 'id': '5f0c6a7b8c9d0e1f2a3b4c5d', 'finished': '2020-07-13T10:15:30.123Z',
+            'baseurl': 'https://example.com/images/', 'pictures': items}
+
+
+# Returns a synthetic get_packages response
+def packages_payload(packages=100, seed=0):
+    rnd = random.Random(seed)
+    return {'status': 'ok', 'packages': [
+        {'id': '{:024x}'.format(n), 'name': 'Package {}'.format(n), 'type': 'BoundingBoxes',
+         'status': rnd.choice(['ACTIVE', 'STOPPED', 'FINISHED']),
+         'created': '2020-07-{:02d}T10:{:02d}:30.123Z'.format(n % 28 + 1, n % 60),
+         'amount': round(rnd.uniform(1, 100), 2), 'pictures_num': 1000, 'completed_num': rnd.randint(0, 1000)}
+        for n in range(packages)]}
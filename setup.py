@@ -17,9 +17,26 @@ setuptools.setup(
     packages=["tagias"],
     classifiers=[
         "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
+        "Programming Language :: Python :: 3.12",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.4',
+    python_requires='>=3.7',
     install_requires=["requests"],
+    entry_points={
+        "console_scripts": ["tagias=tagias.cli:main"],
+    },
+    extras_require={
+        "async": ["aiohttp"],
+        "numpy": ["numpy"],
+        "fast": ["orjson"],
+        "arrow": ["pyarrow"],
+        "compression": ["brotli", "zstandard"],
+    },
 )
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+
+from .codec import get_codec
+
+
+# Persistent on-disk cache of package results with size-based LRU eviction; every result is stored in
+# its own <key>.json file next to a small <key>.meta file, so the cache directory can be shared by several processes
+class TagiasResultCache:
+    # Opens (or creates) the cache directory; the least recently used results are evicted when
+    # the total size of the cached results exceeds max_bytes; codec is the JSON codec for the results (see tagias.codec)
+    def __init__(self, path, max_bytes=1024 ** 3, codec=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.codec = get_codec(codec)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    # Returns the file path for the package id and the extension
+    def _file(self, id, ext):
+        return os.path.join(self.path, hashlib.sha1(id.encode('utf-8')).hexdigest() + ext)
+
+    # Writes the data to the file atomically
+    def _write(self, filename, data):
+        tmp = '{}.{}.{}.tmp'.format(filename, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, filename)
+
+    # Returns the metadata ({'id', 'version', 'final', 'size'}) of the cached result of the package or None
+    def lookup(self, id):
+        try:
+            with open(self._file(id, '.meta'), 'rb') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    # Returns the cached result of the package if it was stored for the same version, otherwise None
+    def get(self, id, version):
+        entry = self.lookup(id)
+        data = None
+        if entry is not None and entry.get('version') == version:
+            filename = self._file(id, '.json')
+            try:
+                with open(filename, 'rb') as f:
+                    data = f.read()
+                # the modification time is used as the last access time for the LRU eviction
+                os.utime(filename)
+            except OSError:
+                data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.bytes_saved += len(data)
+        return self.codec.loads(data)
+
+    # Stores the result of the package for the version; final marks the results that never change
+    def put(self, id, version, result, final=False):
+        data = self.codec.dumps(result)
+        meta = {'id': id, 'version': version, 'final': final, 'size': len(data)}
+        self._write(self._file(id, '.json'), data)
+        self._write(self._file(id, '.meta'), json.dumps(meta).encode('utf-8'))
+        self.evict()
+
+    # Removes the cached result of the package
+    def invalidate(self, id):
+        for ext in ('.meta', '.json'):
+            try:
+                os.remove(self._file(id, ext))
+            except OSError:
+                pass
+
+    # Removes the least recently used results until the cache fits into max_bytes
+    def evict(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        for mtime, size, filename in files:
+            if total <= self.max_bytes:
+                break
+            for path in (filename[:-len('.json')] + '.meta', filename):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    # Removes all cached results
+    def clear(self):
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(('.json', '.meta')):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    # Returns the cache statistics of this instance and the current size of the cache directory
+    def stats(self):
+        entries = 0
+        size = 0
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.json'):
+                entries += 1
+                size += entry.stat().st_size
+        return {'hits': self.hits, 'misses': self.misses, 'bytes_saved': self.bytes_saved, 'entries': entries, 'bytes': size}
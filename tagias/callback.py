@@ -0,0 +1,137 @@
+import json
+import logging
+import queue
+import socketserver
+import threading
+from wsgiref.simple_server import make_server, WSGIServer
+
+from .stream import iter_json_array
+from .tagias import TagiasResult, _parse_datetime
+
+
+logger = logging.getLogger(__name__)
+
+
+# Reads the request body from the WSGI input stream in chunks
+def _read_body(stream, length, chunk_size):
+    while length is None or length > 0:
+        size = chunk_size if length is None else min(chunk_size, length)
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        if length is not None:
+            length -= len(chunk)
+        yield chunk
+
+
+# WSGI application that receives the annotations pushed by tagias.com to the package's callback URL.
+# The request body is parsed as a stream, the pictures are grouped into TagiasResult instances of up to batch_size
+# pictures, and the handler is called with them by a pool of worker threads. The queue between the request and
+# the workers holds up to queue_size batches: a full queue stops reading the body (so the sender is slowed down)
+# and the request is answered with 503 if no batch could be queued for timeout seconds.
+# Since a rejected delivery may be repeated by the sender, the handler should tolerate receiving a picture twice.
+class TagiasCallbackApp:
+    def __init__(self, handler, workers=4, queue_size=16, batch_size=1000, timeout=30, chunk_size=65536):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.received = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    # Calls the handler for the queued batches until close() is called
+    def _work(self):
+        while True:
+            result = self._queue.get()
+            try:
+                if result is None:
+                    return
+                self.handler(result)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                logger.exception('TAGIAS callback handler failed')
+            finally:
+                self._queue.task_done()
+
+    # Queues the batch of pictures as a TagiasResult instance with the result attributes read so far
+    def _put(self, header, pictures):
+        result = dict(header)
+        result.pop('status', None)
+        result['finished'] = _parse_datetime(result.get('finished'))
+        result['pictures'] = pictures
+        self._queue.put(TagiasResult(result), timeout=self.timeout)
+        with self._lock:
+            self.received += len(pictures)
+
+    # Waits until all queued batches are handled
+    def join(self):
+        self._queue.join()
+
+    # Waits until all queued batches are handled and stops the worker threads
+    def close(self):
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') != 'POST':
+            return self._respond(start_response, '405 Method Not Allowed', 'error', [('Allow', 'POST')])
+        # the body is read until the end of the stream only if the length is not known
+        length = environ.get('CONTENT_LENGTH')
+        if length in (None, ''):
+            length = None
+        else:
+            try:
+                length = int(length)
+            except ValueError:
+                return self._respond(start_response, '400 Bad Request', 'error')
+            if length <= 0:
+                return self._respond(start_response, '400 Bad Request', 'error')
+
+        header = {}
+        batch = []
+        queued = False
+        try:
+            for picture in iter_json_array(_read_body(environ['wsgi.input'], length, self.chunk_size), 'pictures', header):
+                batch.append(picture)
+                if len(batch) >= self.batch_size:
+                    self._put(header, batch)
+                    batch = []
+                    queued = True
+            if batch or not queued:
+                self._put(header, batch)
+        except ValueError:
+            return self._respond(start_response, '400 Bad Request', 'error')
+        except queue.Full:
+            return self._respond(start_response, '503 Service Unavailable', 'error', [('Retry-After', str(int(self.timeout)))])
+        return self._respond(start_response, '200 OK', 'ok')
+
+    def _respond(self, start_response, status, body_status, headers=None):
+        body = json.dumps({'status': body_status}).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))] + (headers or []))
+        return [body]
+
+
+# WSGI server that handles every request in a separate thread
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+# Runs the standalone callback receiver server until it is interrupted; the options are passed to TagiasCallbackApp
+def run_callback_server(handler, host='0.0.0.0', port=8080, **options):
+    app = TagiasCallbackApp(handler, **options)
+    server = make_server(host, port, app, server_class=_ThreadingWSGIServer)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        app.close()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+from . import mirror
+from .tagias import TagiasHelper, TagiasTypes
+from .orchestrator import TagiasOrchestrator
+
+
+# Reads the picture names from the file (or stdin for '-'), one per line
+def _read_pictures(filename):
+    if filename == '-':
+        return [line.strip() for line in sys.stdin if line.strip()]
+    with open(filename, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _helper(args):
+    if not args.api_key:
+        raise SystemExit('tagias: the API key is required (--api-key or TAGIAS_API_KEY)')
+    return TagiasHelper(args.api_key, url=args.url)
+
+
+def _orchestrator(args, helper=None):
+    return TagiasOrchestrator(helper, args.jobs, max_workers=getattr(args, 'workers', 8),
+                              min_interval=getattr(args, 'min_interval', 30), max_interval=getattr(args, 'max_interval', 1800),
+                              harvest_dir=getattr(args, 'harvest_dir', None),
+                              request_result=getattr(args, 'request_result', False))
+
+
+def _submit(args):
+    with _orchestrator(args) as orchestrator:
+        job_id = orchestrator.submit(args.name, args.type, args.descr, args.label, args.callback, args.baseurl,
+                                     _read_pictures(args.pictures), args.label_required, args.priority,
+                                     not args.no_start, args.job_id)
+    print(job_id)
+    return 0
+
+
+def _track(args):
+    with _orchestrator(args) as orchestrator:
+        for package_id in args.package_ids:
+            print(orchestrator.track(package_id, args.priority))
+    return 0
+
+
+def _run(args):
+    with _helper(args) as helper, _orchestrator(args, helper) as orchestrator:
+        summary = orchestrator.run(forever=args.forever, poll=args.poll)
+    print(json.dumps(summary, sort_keys=True))
+    return 1 if summary.get('failed') else 0
+
+
+def _status(args):
+    with _orchestrator(args) as orchestrator:
+        jobs = orchestrator.jobs(args.state)
+    print('{:<32} {:<9} {:<24} {:<10} {:>12} {}'.format('job', 'state', 'package', 'status', 'completed', 'error'))
+    for job in jobs:
+        completed = '{}/{}'.format(job['completed_num'], job['pictures_num']) if job['pictures_num'] is not None else ''
+        print('{:<32} {:<9} {:<24} {:<10} {:>12} {}'.format(job['id'], job['state'], job['package_id'] or '',
+                                                            job['status'] or '', completed, job['error'] or ''))
+    return 0
+
+
+def _mirror(args):
+    with _helper(args) as helper:
+        return mirror.run(helper, args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='tagias', description='TAGIAS package lifecycle tools')
+    parser.add_argument('--api-key', default=os.environ.get('TAGIAS_API_KEY'),
+                        help='TAGIAS API key (default: the TAGIAS_API_KEY environment variable)')
+    parser.add_argument('--url', default=None, help='TAGIAS API endpoint URL')
+    parser.add_argument('--jobs', default='tagias-jobs.db', help='job database file (default: tagias-jobs.db)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log the job failures')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    submit = commands.add_parser('submit', help='add a job that creates, starts, watches and harvests a package')
+    submit.add_argument('--name', required=True)
+    submit.add_argument('--type', required=True, choices=[TagiasTypes.BoundingBoxes, TagiasTypes.Polygons,
+                                                          TagiasTypes.Keypoints, TagiasTypes.ClassificationSingle,
+                                                          TagiasTypes.ClassificationMultiple, TagiasTypes.Lines])
+    submit.add_argument('--descr', required=True)
+    submit.add_argument('--label', action='append', help='annotation label (can be repeated)')
+    submit.add_argument('--label-required', action='append', help='required label (can be repeated)')
+    submit.add_argument('--callback', default=None)
+    submit.add_argument('--baseurl', default=None)
+    submit.add_argument('--pictures', required=True, help="file with the picture names, one per line ('-' for stdin)")
+    submit.add_argument('--priority', type=int, default=0)
+    submit.add_argument('--no-start', action='store_true', help='do not start the package after creating it')
+    submit.add_argument('--job-id', default=None)
+    submit.set_defaults(func=_submit)
+
+    track = commands.add_parser('track', help='add jobs that watch and harvest existing packages')
+    track.add_argument('package_ids', nargs='+')
+    track.add_argument('--priority', type=int, default=0)
+    track.set_defaults(func=_track)
+
+    run = commands.add_parser('run', help='process the jobs until all of them are done')
+    run.add_argument('--workers', type=int, default=8, help='concurrent API calls')
+    run.add_argument('--min-interval', type=float, default=30, help='shortest polling interval, seconds')
+    run.add_argument('--max-interval', type=float, default=1800, help='longest polling interval, seconds')
+    run.add_argument('--harvest-dir', default=None, help='directory for the results of the finished packages')
+    run.add_argument('--request-result', action='store_true', help='deliver the results to the package callbacks')
+    run.add_argument('--forever', action='store_true', help='keep running and pick up the new jobs')
+    run.add_argument('--poll', type=float, default=5.0, help='interval of checking for new jobs, seconds')
+    run.set_defaults(func=_run)
+
+    status = commands.add_parser('status', help='list the jobs')
+    status.add_argument('--state', action='append', help='list only the jobs in this state (can be repeated)')
+    status.set_defaults(func=_status)
+
+    mirror_command = commands.add_parser('mirror', help='mirror the packages, results and balance into SQLite')
+    mirror.add_arguments(mirror_command)
+    mirror_command.set_defaults(func=_mirror)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR, format='%(asctime)s %(message)s')
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
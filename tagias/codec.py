@@ -0,0 +1,46 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSON codec based on the standard json module; dumps returns bytes and loads accepts bytes or str
+class TagiasJsonCodec:
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+# JSON codec based on the optional orjson package
+class TagiasOrjsonCodec(TagiasJsonCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError('TagiasOrjsonCodec requires the orjson package (pip install tagias[fast])')
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+# Returns the JSON codec: None selects orjson when it is installed and the standard json module otherwise,
+# 'json' and 'orjson' select the codec by name, and any object with dumps and loads methods is returned as is
+def get_codec(codec=None):
+    if codec is None:
+        return TagiasOrjsonCodec() if orjson is not None else TagiasJsonCodec()
+    if codec == 'json':
+        return TagiasJsonCodec()
+    if codec == 'orjson':
+        return TagiasOrjsonCodec()
+    if hasattr(codec, 'dumps') and hasattr(codec, 'loads'):
+        return codec
+    raise ValueError('Unknown JSON codec: {!r}'.format(codec))
@@ -0,0 +1,155 @@
+import itertools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .tagias import TagiasTypes
+
+
+# Columnar NumPy representation of a TAGIAS result; every shape array has a matching *_picture array with
+# the index of the picture in names and a *_label array with the index of the label in labels (-1 if missing)
+class TagiasColumns:
+    def __init__(self):
+        # picture names and the vocabulary of all labels
+        self.names = None
+        self.labels = None
+        # N x 4 array of bounding boxes as (x1, y1, x2, y2)
+        self.boxes = None
+        self.box_picture = None
+        self.box_label = None
+        # M x 2 arrays of points; the points of the i-th shape are points[offsets[i]:offsets[i + 1]]
+        self.line_points = None
+        self.line_offsets = None
+        self.line_picture = None
+        self.line_label = None
+        self.polygon_points = None
+        self.polygon_offsets = None
+        self.polygon_picture = None
+        self.polygon_label = None
+        # K x 2 array of keypoints
+        self.keypoints = None
+        self.keypoint_picture = None
+        self.keypoint_label = None
+        # ClassificationSingle labels, one per classified picture
+        self.class_picture = None
+        self.class_label = None
+        # ClassificationMultiple labels; the labels of the i-th picture are multi_labels[multi_offsets[i]:multi_offsets[i + 1]]
+        self.multi_picture = None
+        self.multi_offsets = None
+        self.multi_labels = None
+        # pictures with a TagiasResultError and their error codes
+        self.error_picture = None
+        self.errors = None
+
+    def __repr__(self):
+        if self.names is None:
+            return '{}()'.format(self.__class__.__name__)
+        return ('{}(pictures={}, boxes={}, lines={}, polygons={}, keypoints={}, labels={})'.format(
+            self.__class__.__name__, len(self.names), len(self.boxes), len(self.line_picture),
+            len(self.polygon_picture), len(self.keypoints), len(self.labels)))
+
+
+# Returns the list of the source JSON pictures of a TagiasResult instance, a TagiasHelper.get_result dict
+# or a list of picture dicts
+def _source_pictures(result):
+    if isinstance(result, dict):
+        return result.get('pictures') or []
+    if hasattr(result, '_result'):
+        return result._result.get('pictures') or []
+    return result
+
+
+# Returns the N x 2 float array of the points of the shapes and the N + 1 offsets of every shape
+def _points(shapes):
+    counts = np.fromiter((len(s['points']) for s in shapes), np.int64, len(shapes))
+    offsets = np.zeros(len(shapes) + 1, np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    coords = np.fromiter(itertools.chain.from_iterable((p['x'], p['y']) for s in shapes for p in s['points']),
+                         np.float64, 2 * int(offsets[-1]))
+    return coords.reshape(-1, 2), offsets
+
+
+# Returns the N x 4 float array of the bounding boxes normalized to (x1, y1, x2, y2)
+def _boxes(shapes):
+    if not shapes:
+        return np.zeros((0, 4), np.float64)
+    xywh = np.fromiter(('x' in s for s in shapes), np.bool_, len(shapes))
+    values = np.array([(s['x'], s['y'], s['width'], s['height']) if 'x' in s else (s['x1'], s['y1'], s['x2'], s['y2'])
+                       for s in shapes], np.float64)
+    values[xywh, 2:] += values[xywh, :2]
+    return values
+
+
+# Converts a TagiasResult (or a TagiasHelper.get_result dict) to the TagiasColumns instance with NumPy arrays
+def to_columns(result):
+    if np is None:
+        raise ImportError('to_columns requires the numpy package (pip install tagias[numpy])')
+
+    pictures = _source_pictures(result)
+    shapes = {TagiasTypes.BoundingBoxes: [], TagiasTypes.Lines: [], TagiasTypes.Polygons: [], TagiasTypes.Keypoints: []}
+    indexes = {key: [] for key in shapes}
+    singles, single_indexes = [], []
+    multiples, multiple_indexes = [], []
+    errors, error_indexes = [], []
+    for i, picture in enumerate(pictures):
+        data = picture.get('result')
+        if isinstance(data, list):
+            for shape in data:
+                resulttype = shape.get('type')
+                if resulttype in shapes:
+                    shapes[resulttype].append(shape)
+                    indexes[resulttype].append(i)
+        elif data is not None:
+            resulttype = data.get('type')
+            if resulttype == TagiasTypes.ClassificationSingle:
+                singles.append(data.get('label'))
+                single_indexes.append(i)
+            elif resulttype == TagiasTypes.ClassificationMultiple:
+                multiples.append(data.get('labels') or [])
+                multiple_indexes.append(i)
+            elif 'error' in data:
+                errors.append(data.get('error'))
+                error_indexes.append(i)
+
+    # all labels are encoded at once against a sorted vocabulary; missing labels are encoded as -1,
+    # while an empty label is a label of its own
+    groups = [[s.get('label') for s in shapes[key]] for key in (TagiasTypes.BoundingBoxes, TagiasTypes.Lines,
+                                                                 TagiasTypes.Polygons, TagiasTypes.Keypoints)]
+    groups.append(singles)
+    groups.append(list(itertools.chain.from_iterable(multiples)))
+    flat = list(itertools.chain.from_iterable(groups))
+    present = np.fromiter((label is not None for label in flat), np.bool_, len(flat))
+    vocabulary, inverse = np.unique(np.array([str(label) for label in flat if label is not None], dtype=str),
+                                    return_inverse=True)
+    codes = np.full(len(flat), -1, np.int64)
+    codes[present] = inverse.reshape(-1)
+    bounds = np.cumsum([0] + [len(group) for group in groups])
+    label_codes = [codes[bounds[k]:bounds[k + 1]] for k in range(len(groups))]
+
+    columns = TagiasColumns()
+    columns.names = np.array([picture.get('name') for picture in pictures], dtype=object)
+    columns.labels = vocabulary.tolist()
+    columns.boxes = _boxes(shapes[TagiasTypes.BoundingBoxes])
+    columns.box_picture = np.array(indexes[TagiasTypes.BoundingBoxes], np.int64)
+    columns.box_label = label_codes[0]
+    columns.line_points, columns.line_offsets = _points(shapes[TagiasTypes.Lines])
+    columns.line_picture = np.array(indexes[TagiasTypes.Lines], np.int64)
+    columns.line_label = label_codes[1]
+    columns.polygon_points, columns.polygon_offsets = _points(shapes[TagiasTypes.Polygons])
+    columns.polygon_picture = np.array(indexes[TagiasTypes.Polygons], np.int64)
+    columns.polygon_label = label_codes[2]
+    keypoints = shapes[TagiasTypes.Keypoints]
+    columns.keypoints = np.array([(s['x'], s['y']) for s in keypoints], np.float64).reshape(-1, 2)
+    columns.keypoint_picture = np.array(indexes[TagiasTypes.Keypoints], np.int64)
+    columns.keypoint_label = label_codes[3]
+    columns.class_picture = np.array(single_indexes, np.int64)
+    columns.class_label = label_codes[4]
+    columns.multi_picture = np.array(multiple_indexes, np.int64)
+    columns.multi_offsets = np.zeros(len(multiples) + 1, np.int64)
+    np.cumsum([len(labels) for labels in multiples], out=columns.multi_offsets[1:])
+    columns.multi_labels = label_codes[5]
+    columns.error_picture = np.array(error_indexes, np.int64)
+    columns.errors = np.array(errors, dtype=object)
+    return columns
@@ -0,0 +1,90 @@
+import gzip
+import threading
+import zlib
+
+try:
+    from urllib3.util.request import ACCEPT_ENCODING
+except ImportError:
+    ACCEPT_ENCODING = 'gzip,deflate'
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Returns the compressed data for the Content-Encoding
+def compress(data, encoding, level=None):
+    if encoding == 'gzip':
+        return gzip.compress(data, 6 if level is None else level)
+    if encoding == 'deflate':
+        return zlib.compress(data, 6 if level is None else level)
+    if encoding == 'br':
+        if brotli is None:
+            raise ImportError('The br encoding requires the brotli package (pip install tagias[compression])')
+        return brotli.compress(data, quality=5 if level is None else level)
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise ImportError('The zstd encoding requires the zstandard package (pip install tagias[compression])')
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+    raise ValueError('Unknown content encoding: {!r}'.format(encoding))
+
+
+# Compression settings of a TagiasHelper and its transfer statistics: the request bodies of at least threshold bytes
+# are compressed with request_encoding ('gzip', 'deflate', 'br', 'zstd' or None to send them as is), and
+# the responses are requested with accept_encoding (by default every encoding the installed urllib3 can decode:
+# gzip and deflate, plus br and zstd when brotli and zstandard are installed); the responses are decompressed
+# by urllib3 as they are read, including the streamed ones. stats() reports the wire and the decoded bytes
+class TagiasCompression:
+    def __init__(self, request_encoding='gzip', threshold=1024, level=None, accept_encoding=None):
+        if request_encoding is not None:
+            # fails early if the encoding is unknown or its package is not installed
+            compress(b'', request_encoding, level)
+        self.request_encoding = request_encoding
+        self.threshold = threshold
+        self.level = level
+        self.accept_encoding = accept_encoding or ACCEPT_ENCODING
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(('requests', 'compressed_requests', 'request_bytes', 'request_wire_bytes',
+                                     'responses', 'response_bytes', 'response_wire_bytes'), 0)
+
+    # Returns the request body to send and its Content-Encoding (None if it is not compressed)
+    def encode(self, data):
+        if self.request_encoding is None or data is None or len(data) < self.threshold:
+            return data, None
+        return compress(data, self.request_encoding, self.level), self.request_encoding
+
+    # Adds the decoded and the sent size of a request body to the statistics
+    def add_request(self, size, wire_size):
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['request_bytes'] += size
+            self._stats['request_wire_bytes'] += wire_size
+            if wire_size != size:
+                self._stats['compressed_requests'] += 1
+
+    # Adds the decoded and the received size of a response body to the statistics
+    def add_response(self, size, wire_size):
+        with self._lock:
+            self._stats['responses'] += 1
+            self._stats['response_bytes'] += size
+            self._stats['response_wire_bytes'] += wire_size
+
+    # Returns the transfer statistics with the ratios of the wire bytes to the decoded bytes
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['request_ratio'] = stats['request_wire_bytes'] / stats['request_bytes'] if stats['request_bytes'] else None
+        stats['response_ratio'] = stats['response_wire_bytes'] / stats['response_bytes'] if stats['response_bytes'] else None
+        return stats
+
+    # Resets the transfer statistics
+    def reset(self):
+        with self._lock:
+            for key in self._stats:
+                self._stats[key] = 0
@@ -0,0 +1,243 @@
+import itertools
+import os
+import shutil
+import tempfile
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from .codec import get_codec
+from .columnar import _source_pictures
+from .geometry import _box_bounds
+from .tagias import TagiasTypes, TagiasPictureResult
+
+
+# Yields the source JSON pictures of a TagiasResult instance, a TagiasHelper.get_result dict or an iterable of
+# TagiasPictureResult instances or picture dicts (e.g. from iter_result)
+def _iter_pictures(source):
+    for picture in _source_pictures(source):
+        if isinstance(picture, TagiasPictureResult):
+            yield picture._picture
+        else:
+            yield picture
+
+
+# Opens the path for writing in binary mode, or returns the file object as is; the second value tells
+# whether the file must be closed by the caller
+def _open(target):
+    if hasattr(target, 'write'):
+        return target, False
+    return open(target, 'wb'), True
+
+
+# Writes the pictures as line-delimited JSON, one {'name', 'result'} object per line, to the path or
+# the binary file object; the lines are written in batches of batch_size pictures. Returns the number of pictures
+def export_jsonl(source, target, batch_size=1000, codec=None):
+    codec = get_codec(codec)
+    f, close = _open(target)
+    count = 0
+    try:
+        pictures = _iter_pictures(source)
+        while True:
+            batch = [codec.dumps({'name': picture.get('name'), 'result': picture.get('result')})
+                     for picture in itertools.islice(pictures, batch_size)]
+            if not batch:
+                break
+            batch.append(b'')
+            f.write(b'\n'.join(batch))
+            count += len(batch) - 1
+    finally:
+        if close:
+            f.close()
+    return count
+
+
+# Returns the COCO annotations of the picture: BoundingBoxes and Polygons are standard COCO object annotations,
+# Keypoints are annotations with a single keypoint, Lines keep their points in the 'polyline' attribute and
+# the classifications are annotations without geometry; every annotation has the 'tagias_type' attribute
+def _coco_annotations(result, image_id, category):
+    annotations = []
+    if isinstance(result, list):
+        for shape in result:
+            resulttype = shape.get('type')
+            annotation = {'image_id': image_id, 'category_id': category(shape.get('label')), 'tagias_type': resulttype,
+                          'iscrowd': 0}
+            if resulttype == TagiasTypes.BoundingBoxes:
+                x1, y1, x2, y2 = _box_bounds(shape)
+                annotation['bbox'] = [x1, y1, x2 - x1, y2 - y1]
+                annotation['area'] = (x2 - x1) * (y2 - y1)
+            elif resulttype == TagiasTypes.Polygons:
+                points = shape.get('points') or []
+                xs = [p['x'] for p in points]
+                ys = [p['y'] for p in points]
+                annotation['segmentation'] = [[c for p in points for c in (p['x'], p['y'])]]
+                if points:
+                    annotation['bbox'] = [min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)]
+                annotation['area'] = abs(sum(xs[i] * ys[i - 1] - xs[i - 1] * ys[i] for i in range(len(points)))) / 2.0
+            elif resulttype == TagiasTypes.Lines:
+                annotation['polyline'] = [c for p in shape.get('points') or [] for c in (p['x'], p['y'])]
+            elif resulttype == TagiasTypes.Keypoints:
+                annotation['keypoints'] = [shape.get('x'), shape.get('y'), 2]
+                annotation['num_keypoints'] = 1
+            annotations.append(annotation)
+    elif result is not None and result.get('type') == TagiasTypes.ClassificationSingle:
+        annotations.append({'image_id': image_id, 'category_id': category(result.get('label')),
+                            'tagias_type': TagiasTypes.ClassificationSingle, 'iscrowd': 0})
+    elif result is not None and result.get('type') == TagiasTypes.ClassificationMultiple:
+        for label in result.get('labels') or []:
+            annotations.append({'image_id': image_id, 'category_id': category(label),
+                                'tagias_type': TagiasTypes.ClassificationMultiple, 'iscrowd': 0})
+    return annotations
+
+
+# Writes the pictures as a COCO-style JSON document to the path or the binary file object without holding
+# the dataset in memory: the images are written directly, the annotations are spooled to a temporary file and appended
+# after the images, and only the label categories are kept in memory. The pictures with a TagiasResultError have
+# the 'tagias_error' attribute in their image entries. Returns the number of images and annotations
+def export_coco(source, target, batch_size=1000, codec=None, categories=None):
+    codec = get_codec(codec)
+    # label -> category id; categories may provide the ids of the known labels in advance
+    category_ids = dict(categories or {})
+
+    def category(label):
+        id = category_ids.get(label)
+        if id is None:
+            id = category_ids[label] = max(category_ids.values(), default=0) + 1
+        return id
+
+    f, close = _open(target)
+    spool_dir = os.path.dirname(os.path.abspath(target)) if not hasattr(target, 'write') else None
+    images = 0
+    annotations = 0
+    try:
+        with tempfile.TemporaryFile(dir=spool_dir) as spool:
+            f.write(b'{"images":[')
+            pictures = _iter_pictures(source)
+            while True:
+                batch = list(itertools.islice(pictures, batch_size))
+                if not batch:
+                    break
+                image_lines = []
+                annotation_lines = []
+                for picture in batch:
+                    images += 1
+                    image = {'id': images, 'file_name': picture.get('name')}
+                    result = picture.get('result')
+                    if isinstance(result, dict) and 'error' in result:
+                        image['tagias_error'] = result.get('error')
+                    image_lines.append(codec.dumps(image))
+                    for annotation in _coco_annotations(result, images, category):
+                        annotations += 1
+                        annotation['id'] = annotations
+                        annotation_lines.append(codec.dumps(annotation))
+                if images > len(batch):
+                    f.write(b',')
+                f.write(b','.join(image_lines))
+                if annotation_lines:
+                    if annotations > len(annotation_lines):
+                        spool.write(b',')
+                    spool.write(b','.join(annotation_lines))
+            f.write(b'],"annotations":[')
+            spool.seek(0)
+            shutil.copyfileobj(spool, f)
+            f.write(b'],"categories":')
+            f.write(codec.dumps([{'id': id, 'name': label} for label, id in sorted(category_ids.items(), key=lambda x: x[1])]))
+            f.write(b'}')
+    finally:
+        if close:
+            f.close()
+    return images, annotations
+
+
+# Columns of the Arrow tables: one row per shape, classification label or error, and one row with an empty type for
+# the pictures without annotations; bounding boxes are normalized to x1, y1, x2, y2, keypoints use x and y,
+# lines and polygons use points, ClassificationMultiple uses labels and errors use error
+_ARROW_COLUMNS = ('picture', 'type', 'label', 'labels', 'x1', 'y1', 'x2', 'y2', 'x', 'y', 'points', 'error')
+
+
+# Returns the Arrow schema of the exported tables
+def arrow_schema():
+    if pyarrow is None:
+        raise ImportError('The Arrow export requires the pyarrow package (pip install tagias[arrow])')
+    point = pyarrow.struct([('x', pyarrow.float64()), ('y', pyarrow.float64())])
+    return pyarrow.schema([
+        ('picture', pyarrow.string()), ('type', pyarrow.string()), ('label', pyarrow.string()),
+        ('labels', pyarrow.list_(pyarrow.string())),
+        ('x1', pyarrow.float64()), ('y1', pyarrow.float64()), ('x2', pyarrow.float64()), ('y2', pyarrow.float64()),
+        ('x', pyarrow.float64()), ('y', pyarrow.float64()), ('points', pyarrow.list_(point)), ('error', pyarrow.string()),
+    ])
+
+
+# Appends the rows of the picture to the column lists
+def _append_rows(columns, picture):
+    name = picture.get('name')
+    result = picture.get('result')
+    rows = []
+    if isinstance(result, list):
+        for shape in result:
+            resulttype = shape.get('type')
+            row = {'type': resulttype, 'label': shape.get('label')}
+            if resulttype == TagiasTypes.BoundingBoxes:
+                row['x1'], row['y1'], row['x2'], row['y2'] = _box_bounds(shape)
+            elif resulttype == TagiasTypes.Keypoints:
+                row['x'] = shape.get('x')
+                row['y'] = shape.get('y')
+            elif resulttype in (TagiasTypes.Lines, TagiasTypes.Polygons):
+                row['points'] = shape.get('points')
+            rows.append(row)
+    elif result is not None:
+        resulttype = result.get('type')
+        if resulttype == TagiasTypes.ClassificationSingle:
+            rows.append({'type': resulttype, 'label': result.get('label')})
+        elif resulttype == TagiasTypes.ClassificationMultiple:
+            rows.append({'type': resulttype, 'labels': result.get('labels')})
+        elif 'error' in result:
+            rows.append({'type': None, 'error': result.get('error')})
+    if not rows:
+        rows.append({'type': None})
+    for row in rows:
+        columns['picture'].append(name)
+        for column in _ARROW_COLUMNS[1:]:
+            columns[column].append(row.get(column))
+    return len(rows)
+
+
+# Yields the pictures as Arrow record batches of about batch_size rows (see arrow_schema)
+def iter_record_batches(source, batch_size=65536):
+    schema = arrow_schema()
+    columns = {column: [] for column in _ARROW_COLUMNS}
+    size = 0
+    for picture in _iter_pictures(source):
+        size += _append_rows(columns, picture)
+        if size >= batch_size:
+            yield pyarrow.RecordBatch.from_pydict(columns, schema=schema)
+            columns = {column: [] for column in _ARROW_COLUMNS}
+            size = 0
+    if size:
+        yield pyarrow.RecordBatch.from_pydict(columns, schema=schema)
+
+
+# Writes the pictures to a Parquet file in row groups of about batch_size rows; returns the number of rows
+def export_parquet(source, target, batch_size=65536, compression='zstd'):
+    schema = arrow_schema()
+    rows = 0
+    with pyarrow.parquet.ParquetWriter(target, schema, compression=compression) as writer:
+        for batch in iter_record_batches(source, batch_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+# Writes the pictures to an Arrow IPC (Feather v2) file in batches of about batch_size rows; returns the number of rows
+def export_arrow(source, target, batch_size=65536):
+    schema = arrow_schema()
+    rows = 0
+    with pyarrow.ipc.new_file(target, schema) as writer:
+        for batch in iter_record_batches(source, batch_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
@@ -0,0 +1,387 @@
+import copy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .tagias import TagiasTypes
+from .columnar import _source_pictures, _boxes, _points
+
+
+_SHAPE_TYPES = (TagiasTypes.BoundingBoxes, TagiasTypes.Lines, TagiasTypes.Polygons, TagiasTypes.Keypoints)
+
+
+# Returns the name of the geometry backend: None selects numpy when it is installed and the pure Python
+# implementation otherwise, 'numpy' and 'python' select the backend by name
+def _get_backend(backend=None):
+    if backend is None:
+        return 'numpy' if np is not None else 'python'
+    if backend == 'numpy':
+        if np is None:
+            raise ImportError('The numpy geometry backend requires the numpy package (pip install tagias[numpy])')
+        return backend
+    if backend == 'python':
+        return backend
+    raise ValueError('Unknown geometry backend: {!r}'.format(backend))
+
+
+# Returns the (x1, y1, x2, y2) bounds of the bounding box JSON in either coordinate convention
+def _box_bounds(shape):
+    if 'x' in shape:
+        return shape['x'], shape['y'], shape['x'] + shape['width'], shape['y'] + shape['height']
+    return shape['x1'], shape['y1'], shape['x2'], shape['y2']
+
+
+# Returns the (x1, y1, x2, y2) bounds of the points
+def _point_bounds(points):
+    if not points:
+        return 0.0, 0.0, 0.0, 0.0
+    xs = [p['x'] for p in points]
+    ys = [p['y'] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+# Returns the polygon area by the shoelace formula
+def _polygon_area(points):
+    area = 0.0
+    n = len(points)
+    for i in range(n):
+        p, q = points[i], points[(i + 1) % n]
+        area += p['x'] * q['y'] - q['x'] * p['y']
+    return abs(area) / 2.0
+
+
+# Returns the per-polygon areas of the N x 2 points with the N + 1 offsets by the shoelace formula
+def _polygon_areas(points, offsets):
+    areas = np.zeros(len(offsets) - 1, np.float64)
+    if len(points) == 0:
+        return areas
+    # the index of the next point of every point, wrapping around at the end of its polygon
+    following = np.arange(1, len(points) + 1)
+    counts = np.diff(offsets)
+    nonempty = counts > 0
+    following[offsets[1:][nonempty] - 1] = offsets[:-1][nonempty]
+    x, y = points[:, 0], points[:, 1]
+    cross = x * y[following] - x[following] * y
+    areas[nonempty] = np.abs(np.add.reduceat(cross, offsets[:-1][nonempty])) / 2.0
+    return areas
+
+
+# Returns the M x K matrix of the intersection over union of the two lists of (x1, y1, x2, y2) bounds
+def _iou_python(a, b):
+    matrix = []
+    for ax1, ay1, ax2, ay2 in a:
+        area_a = (ax2 - ax1) * (ay2 - ay1)
+        row = []
+        for bx1, by1, bx2, by2 in b:
+            w = min(ax2, bx2) - max(ax1, bx1)
+            h = min(ay2, by2) - max(ay1, by1)
+            inter = w * h if w > 0 and h > 0 else 0.0
+            union = area_a + (bx2 - bx1) * (by2 - by1) - inter
+            row.append(inter / union if union > 0 else 0.0)
+        matrix.append(row)
+    return matrix
+
+
+# Returns the intersection over union of the (x1, y1, x2, y2) bounds in the last axis of the broadcast arrays
+def _iou_pairs(a, b):
+    w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = w * h
+    union = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1]) + (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1]) - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+
+
+# Returns the M x K matrix of the intersection over union of the two arrays of (x1, y1, x2, y2) bounds
+def _iou_numpy(a, b):
+    return _iou_pairs(a[:, None, :], b[None, :, :])
+
+
+# Converts the (x1, y1, x2, y2) bounds (an N x 4 array or a list of tuples) to (x, y, width, height)
+def xyxy_to_xywh(bounds):
+    if np is not None and isinstance(bounds, np.ndarray):
+        result = bounds.astype(np.float64, copy=True)
+        result[:, 2:] -= result[:, :2]
+        return result
+    return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in bounds]
+
+
+# Converts the (x, y, width, height) bounds (an N x 4 array or a list of tuples) to (x1, y1, x2, y2)
+def xywh_to_xyxy(bounds):
+    if np is not None and isinstance(bounds, np.ndarray):
+        result = bounds.astype(np.float64, copy=True)
+        result[:, 2:] += result[:, :2]
+        return result
+    return [(x, y, x + w, y + h) for x, y, w, h in bounds]
+
+
+# Geometry of all the shapes of a TAGIAS result (BoundingBoxes, Lines, Polygons and Keypoints) computed in batch;
+# the shapes are kept in the order of the pictures, and the shapes of the i-th picture are the rows
+# offsets[i]:offsets[i + 1] of every per-shape attribute. With the numpy backend the per-shape attributes are
+# NumPy arrays, with the python backend they are lists
+class TagiasGeometry:
+    # result is a TagiasResult instance or a TagiasHelper.get_result dict
+    def __init__(self, result, backend=None):
+        self.backend = _get_backend(backend)
+        pictures = _source_pictures(result)
+        shapes = []
+        picture = []
+        position = []
+        offsets = [0]
+        for i, item in enumerate(pictures):
+            data = item.get('result')
+            if isinstance(data, list):
+                for j, shape in enumerate(data):
+                    if shape.get('type') in _SHAPE_TYPES:
+                        shapes.append(shape)
+                        picture.append(i)
+                        position.append(j)
+            offsets.append(len(shapes))
+
+        self.names = [item.get('name') for item in pictures]
+        self._shapes = shapes
+        if self.backend == 'numpy':
+            self.offsets = np.array(offsets, np.int64)
+            self.picture = np.array(picture, np.int64)
+            self.position = np.array(position, np.int64)
+            self.types = np.array([shape['type'] for shape in shapes], dtype=object)
+            self.labels = np.array([shape.get('label') for shape in shapes], dtype=object)
+            self.bounds = self._numpy_bounds()
+        else:
+            self.offsets = offsets
+            self.picture = picture
+            self.position = position
+            self.types = [shape['type'] for shape in shapes]
+            self.labels = [shape.get('label') for shape in shapes]
+            self.bounds = [self._python_bounds(shape) for shape in shapes]
+        self._areas = None
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def __repr__(self):
+        return '{}(pictures={}, shapes={}, backend={!r})'.format(self.__class__.__name__, len(self.names),
+                                                                  len(self._shapes), self.backend)
+
+    @staticmethod
+    def _python_bounds(shape):
+        resulttype = shape['type']
+        if resulttype == TagiasTypes.BoundingBoxes:
+            return _box_bounds(shape)
+        if resulttype == TagiasTypes.Keypoints:
+            return shape['x'], shape['y'], shape['x'], shape['y']
+        return _point_bounds(shape['points'])
+
+    # Returns the row indexes of the shapes of the given type
+    def _rows(self, resulttype):
+        if self.backend == 'numpy':
+            return np.flatnonzero(self.types == resulttype)
+        return [i for i, t in enumerate(self.types) if t == resulttype]
+
+    def _numpy_bounds(self):
+        bounds = np.zeros((len(self._shapes), 4), np.float64)
+        rows = self._rows(TagiasTypes.BoundingBoxes)
+        bounds[rows] = _boxes([self._shapes[i] for i in rows])
+        rows = self._rows(TagiasTypes.Keypoints)
+        if len(rows):
+            points = np.array([(self._shapes[i]['x'], self._shapes[i]['y']) for i in rows], np.float64)
+            bounds[rows] = np.hstack((points, points))
+        for resulttype in (TagiasTypes.Lines, TagiasTypes.Polygons):
+            rows = self._rows(resulttype)
+            if not len(rows):
+                continue
+            points, offsets = _points([self._shapes[i] for i in rows])
+            nonempty = np.diff(offsets) > 0
+            starts = offsets[:-1][nonempty]
+            target = rows[nonempty]
+            bounds[target, :2] = np.minimum.reduceat(points, starts, axis=0)
+            bounds[target, 2:] = np.maximum.reduceat(points, starts, axis=0)
+        return bounds
+
+    # Returns the areas of the shapes: the box area for BoundingBoxes, the polygon area for Polygons and 0 for Lines
+    # and Keypoints
+    def areas(self):
+        if self._areas is not None:
+            return self._areas
+        if self.backend == 'numpy':
+            areas = np.zeros(len(self._shapes), np.float64)
+            rows = self._rows(TagiasTypes.BoundingBoxes)
+            boxes = self.bounds[rows]
+            areas[rows] = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+            rows = self._rows(TagiasTypes.Polygons)
+            if len(rows):
+                areas[rows] = _polygon_areas(*_points([self._shapes[i] for i in rows]))
+        else:
+            areas = []
+            for shape, (x1, y1, x2, y2) in zip(self._shapes, self.bounds):
+                resulttype = shape['type']
+                if resulttype == TagiasTypes.BoundingBoxes:
+                    areas.append((x2 - x1) * (y2 - y1))
+                elif resulttype == TagiasTypes.Polygons:
+                    areas.append(_polygon_area(shape['points']))
+                else:
+                    areas.append(0.0)
+        self._areas = areas
+        return areas
+
+    # Returns the bounding boxes in the 'xyxy' (x1, y1, x2, y2) or 'xywh' (x, y, width, height) format
+    # regardless of the convention they were annotated in, together with their row indexes
+    def boxes(self, format='xyxy'):
+        if format not in ('xyxy', 'xywh'):
+            raise ValueError('Unknown bounding box format: {!r}'.format(format))
+        rows = self._rows(TagiasTypes.BoundingBoxes)
+        if self.backend == 'numpy':
+            boxes = self.bounds[rows]
+        else:
+            boxes = [self.bounds[i] for i in rows]
+        return (xyxy_to_xywh(boxes) if format == 'xywh' else boxes), rows
+
+    # Returns the row indexes of the shapes of the picture with the given types
+    def _picture_rows(self, index, types):
+        start, stop = int(self.offsets[index]), int(self.offsets[index + 1])
+        if self.backend == 'numpy':
+            rows = np.arange(start, stop)
+            return rows[np.isin(self.types[start:stop], list(types))]
+        return [i for i in range(start, stop) if self.types[i] in types]
+
+    # Returns the bounds of the rows
+    def _take(self, rows):
+        if self.backend == 'numpy':
+            return self.bounds[rows]
+        return [self.bounds[i] for i in rows]
+
+    def _iou(self, a, b):
+        return _iou_numpy(a, b) if self.backend == 'numpy' else _iou_python(a, b)
+
+    # Returns the IoU matrix of the bounds of the shapes of the index-th picture with the given types (the bounding
+    # boxes by default) and the row indexes of these shapes
+    def iou(self, index, types=(TagiasTypes.BoundingBoxes,)):
+        rows = self._picture_rows(index, types)
+        bounds = self._take(rows)
+        return self._iou(bounds, bounds), rows
+
+    # Returns the list of the IoU matrices of all the pictures (see iou)
+    def iou_matrices(self, types=(TagiasTypes.BoundingBoxes,)):
+        if self.backend != 'numpy':
+            return [self.iou(i, types)[0] for i in range(len(self.names))]
+        # the IoU of all the pairs of shapes of the same picture is computed at once and then split into the matrices
+        rows = np.flatnonzero(np.isin(self.types, list(types)))
+        counts = np.bincount(self.picture[rows], minlength=len(self.names))
+        starts = np.zeros(len(counts) + 1, np.int64)
+        np.cumsum(counts, out=starts[1:])
+        sizes = counts[self.picture[rows]]
+        first = np.repeat(np.arange(len(rows)), sizes)
+        pair_starts = np.zeros(len(rows) + 1, np.int64)
+        np.cumsum(sizes, out=pair_starts[1:])
+        second = starts[self.picture[rows]][first] + np.arange(int(pair_starts[-1])) - pair_starts[:-1][first]
+        bounds = self.bounds[rows]
+        values = _iou_pairs(bounds[first], bounds[second])
+        matrix_starts = np.zeros(len(counts) + 1, np.int64)
+        np.cumsum(counts * counts, out=matrix_starts[1:])
+        return [values[matrix_starts[i]:matrix_starts[i + 1]].reshape(n, n) for i, n in enumerate(counts.tolist())]
+
+    # Compares the shapes with the shapes of another TagiasGeometry (e.g. of the same pictures annotated in another
+    # package) and returns a dict with the picture names present in both as the keys and
+    # (matrix, rows, other_rows) tuples as the values, where matrix[i][j] is the IoU of rows[i] and other_rows[j]
+    def iou_between(self, other, types=(TagiasTypes.BoundingBoxes,)):
+        other_index = {name: i for i, name in enumerate(other.names)}
+        matrices = {}
+        for i, name in enumerate(self.names):
+            j = other_index.get(name)
+            if j is None:
+                continue
+            rows = self._picture_rows(i, types)
+            other_rows = other._picture_rows(j, types)
+            bounds = self._take(rows)
+            other_bounds = other._take(other_rows)
+            if self.backend != other.backend:
+                other_bounds = np.asarray(other_bounds, np.float64).reshape(-1, 4) if self.backend == 'numpy' \
+                    else [tuple(b) for b in other_bounds]
+            matrices[name] = (self._iou(bounds, other_bounds), rows, other_rows)
+        return matrices
+
+    # Returns the bounds clipped to the width x height picture area; width and height are scalars or, with the numpy
+    # backend, arrays with one value per picture
+    def clip_bounds(self, width, height):
+        if self.backend == 'numpy':
+            if np.ndim(width):
+                width = np.asarray(width, np.float64)[self.picture]
+            if np.ndim(height):
+                height = np.asarray(height, np.float64)[self.picture]
+            bounds = self.bounds.copy()
+            bounds[:, 0] = np.clip(bounds[:, 0], 0, width)
+            bounds[:, 2] = np.clip(bounds[:, 2], 0, width)
+            bounds[:, 1] = np.clip(bounds[:, 1], 0, height)
+            bounds[:, 3] = np.clip(bounds[:, 3], 0, height)
+            return bounds
+        return [(min(max(x1, 0), width), min(max(y1, 0), height), min(max(x2, 0), width), min(max(y2, 0), height))
+                for x1, y1, x2, y2 in self.bounds]
+
+
+# Returns the copy of the get_result dict (or of the source of a TagiasResult) with all the bounding boxes converted
+# to the 'xyxy' (x1, y1, x2, y2) or 'xywh' (x, y, width, height) convention
+def normalize_boxes(result, format='xyxy'):
+    if format not in ('xyxy', 'xywh'):
+        raise ValueError('Unknown bounding box format: {!r}'.format(format))
+    result = copy.deepcopy(result if isinstance(result, dict) else result._result)
+    for shape in _iter_shapes(result, (TagiasTypes.BoundingBoxes,)):
+        _set_box(shape, _box_bounds(shape), format)
+    return result
+
+
+# Returns the copy of the get_result dict (or of the source of a TagiasResult) with the coordinates of all the shapes
+# clipped to the picture area; size is a (width, height) tuple for all the pictures, a dict with picture names
+# as the keys and (width, height) tuples as the values, or a function that returns (width, height) for a picture name
+# (the pictures without size are not clipped)
+def clip(result, size):
+    result = copy.deepcopy(result if isinstance(result, dict) else result._result)
+    if isinstance(size, tuple):
+        get_size = lambda name: size
+    elif isinstance(size, dict):
+        get_size = size.get
+    else:
+        get_size = size
+    for picture in result.get('pictures') or []:
+        data = picture.get('result')
+        if not isinstance(data, list):
+            continue
+        picture_size = get_size(picture.get('name'))
+        if picture_size is None:
+            continue
+        width, height = picture_size
+        for shape in data:
+            resulttype = shape.get('type')
+            if resulttype == TagiasTypes.BoundingBoxes:
+                x1, y1, x2, y2 = _box_bounds(shape)
+                bounds = (min(max(x1, 0), width), min(max(y1, 0), height), min(max(x2, 0), width), min(max(y2, 0), height))
+                _set_box(shape, bounds, 'xywh' if 'x' in shape else 'xyxy')
+            elif resulttype == TagiasTypes.Keypoints:
+                shape['x'] = min(max(shape['x'], 0), width)
+                shape['y'] = min(max(shape['y'], 0), height)
+            elif resulttype in (TagiasTypes.Lines, TagiasTypes.Polygons):
+                for point in shape['points']:
+                    point['x'] = min(max(point['x'], 0), width)
+                    point['y'] = min(max(point['y'], 0), height)
+    return result
+
+
+# Yields the shapes of the result dict with the given types
+def _iter_shapes(result, types):
+    for picture in result.get('pictures') or []:
+        data = picture.get('result')
+        if isinstance(data, list):
+            for shape in data:
+                if shape.get('type') in types:
+                    yield shape
+
+
+# Replaces the coordinates of the bounding box JSON with the (x1, y1, x2, y2) bounds in the given format
+def _set_box(shape, bounds, format):
+    for name in ('x', 'y', 'width', 'height', 'x1', 'y1', 'x2', 'y2'):
+        shape.pop(name, None)
+    x1, y1, x2, y2 = bounds
+    if format == 'xywh':
+        shape.update(x=x1, y=y1, width=x2 - x1, height=y2 - y1)
+    else:
+        shape.update(x1=x1, y1=y1, x2=x2, y2=y2)
@@ -0,0 +1,159 @@
+from .tagias import TagiasTypes, TagiasResult
+
+
+# Indexed read-only view of a TagiasResult that is built once from the source JSON without converting the pictures:
+# a picture name map, an inverted label index (shape labels, ClassificationSingle label and ClassificationMultiple
+# labels), postings per annotation type and error code, and shape statistics. The queries return the TagiasPictureResult
+# instances of the result (converted on first access) and never rescan the pictures
+class TagiasResultIndex:
+    # result is a TagiasResult instance or a TagiasHelper.get_result dict
+    def __init__(self, result, cache=True, keep_raw=False):
+        if not isinstance(result, TagiasResult):
+            result = TagiasResult(result, cache, keep_raw)
+        self.result = result
+        self._by_name = {}
+        # label -> indexes of the pictures with the label, in ascending order without duplicates
+        self._labels = {}
+        # label -> (picture index, shape position) pairs of the shapes with the label
+        self._shape_labels = {}
+        # annotation type -> indexes of the pictures with the annotation type
+        self._types = {}
+        # annotation type -> (picture index, shape position) pairs of the shapes of the type
+        self._shape_types = {}
+        # error code -> indexes of the pictures with the TagiasResultError
+        self._errors = {}
+        self._empty = []
+        self._shape_count = 0
+
+        for i, picture in enumerate(result._result.get('pictures') or []):
+            self._by_name[picture.get('name')] = i
+            data = picture.get('result')
+            if isinstance(data, list):
+                if not data:
+                    self._empty.append(i)
+                for position, shape in enumerate(data):
+                    resulttype = shape.get('type')
+                    label = shape.get('label')
+                    self._add(self._types, resulttype, i)
+                    self._shape_types.setdefault(resulttype, []).append((i, position))
+                    self._add(self._labels, label, i)
+                    self._shape_labels.setdefault(label, []).append((i, position))
+                self._shape_count += len(data)
+            elif data is None:
+                self._empty.append(i)
+            elif 'error' in data and 'type' not in data:
+                self._add(self._errors, data.get('error'), i)
+            else:
+                resulttype = data.get('type')
+                self._add(self._types, resulttype, i)
+                if resulttype == TagiasTypes.ClassificationMultiple:
+                    for label in data.get('labels') or []:
+                        self._add(self._labels, label, i)
+                else:
+                    self._add(self._labels, data.get('label'), i)
+
+    # Appends the picture index to the postings of the key unless it is already the last one
+    @staticmethod
+    def _add(postings, key, index):
+        items = postings.get(key)
+        if items is None:
+            postings[key] = [index]
+        elif items[-1] != index:
+            items.append(index)
+
+    # Returns the pictures with the indexes
+    def _pictures(self, indexes):
+        pictures = self.result.pictures
+        return [pictures[i] for i in indexes]
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __repr__(self):
+        return '{}(pictures={}, shapes={}, labels={}, errors={})'.format(
+            self.__class__.__name__, len(self._by_name), self._shape_count, len(self._labels),
+            sum(len(items) for items in self._errors.values()))
+
+    # Returns the TagiasPictureResult of the picture with the name, or default if there is no such picture
+    def get(self, name, default=None):
+        index = self._by_name.get(name)
+        return self.result.pictures[index] if index is not None else default
+
+    # Returns the sorted list of all labels
+    @property
+    def labels(self):
+        return sorted(label for label in self._labels if label is not None)
+
+    # Returns the pictures that have the label in a shape or a classification
+    def with_label(self, label):
+        return self._pictures(self._labels.get(label, ()))
+
+    # Returns the pictures that have any of the labels
+    def with_any_label(self, *labels):
+        indexes = set()
+        for label in labels:
+            indexes.update(self._labels.get(label, ()))
+        return self._pictures(sorted(indexes))
+
+    # Returns the pictures that have all the labels
+    def with_all_labels(self, *labels):
+        postings = sorted((self._labels.get(label, []) for label in labels), key=len)
+        if not postings:
+            return []
+        indexes = set(postings[0])
+        for items in postings[1:]:
+            indexes.intersection_update(items)
+        return self._pictures(sorted(indexes))
+
+    # Returns the pictures that have annotations of the type (see TagiasTypes)
+    def with_type(self, resulttype):
+        return self._pictures(self._types.get(resulttype, ()))
+
+    # Returns the pictures with a TagiasResultError, or only with the error code
+    def errors(self, code=None):
+        if code is not None:
+            return self._pictures(self._errors.get(code, ()))
+        return self._pictures(sorted(i for items in self._errors.values() for i in items))
+
+    # Returns the pictures without annotations (no result or an empty list of shapes)
+    def empty(self):
+        return self._pictures(self._empty)
+
+    # Returns the (TagiasPictureResult, shape) pairs of the shapes with the label and/or the type
+    def shapes(self, label=None, type=None):
+        if label is None and type is None:
+            raise ValueError('shapes requires a label or a type')
+        if label is None:
+            postings = self._shape_types.get(type, ())
+        elif type is None:
+            postings = self._shape_labels.get(label, ())
+        else:
+            # the shorter postings list is filtered by the other condition
+            source = self.result._result['pictures']
+            by_label = self._shape_labels.get(label, ())
+            by_type = self._shape_types.get(type, ())
+            if len(by_label) <= len(by_type):
+                postings = [(i, position) for i, position in by_label
+                            if source[i]['result'][position].get('type') == type]
+            else:
+                postings = [(i, position) for i, position in by_type
+                            if source[i]['result'][position].get('label') == label]
+        pictures = self.result.pictures
+        return [(pictures[i], pictures[i].datalist[position]) for i, position in postings]
+
+    # Returns the statistics: the number of pictures, shapes and empty pictures, the number of shapes per shape type
+    # and per label, the number of pictures per annotation type and per label, and the number of errors per code
+    def stats(self):
+        return {
+            'pictures': len(self._by_name),
+            'shapes': self._shape_count,
+            'empty': len(self._empty),
+            'shape_types': {resulttype: len(items) for resulttype, items in self._shape_types.items()},
+            'shape_labels': {label: len(items) for label, items in self._shape_labels.items()},
+            'picture_types': {resulttype: len(items) for resulttype, items in self._types.items()},
+            'picture_labels': {label: len(items) for label, items in self._labels.items()},
+            'errors': {code: len(items) for code, items in self._errors.items()},
+        }
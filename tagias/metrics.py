@@ -0,0 +1,244 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Event of the instrumented helper method call that runs in the current thread or asyncio task
+_current_event = contextvars.ContextVar('tagias_current_event', default=None)
+
+# Phases of a helper method call: 'queue' is the time spent waiting for the rate limiter and the retry backoff,
+# 'network' is the time until the response headers are received (including the connection setup),
+# 'transfer' is the time to read the response body, 'decode' is the JSON decoding time and 'convert' is the rest
+# of the call, mostly the conversion of the decoded JSON to the returned values
+PHASES = ('queue', 'network', 'transfer', 'decode', 'convert')
+
+
+# Timing and size information of one helper method call that is passed to the listeners
+class TagiasCallEvent:
+    __slots__ = ('endpoint', 'method', 'path', 'status', 'requests', 'request_bytes', 'response_bytes',
+                 'request_wire_bytes', 'response_wire_bytes', 'error', 'timings', 'start_time', 'duration')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.method = None
+        self.path = None
+        self.status = None
+        self.requests = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        # the body sizes as sent and received over the network, before decompression
+        self.request_wire_bytes = 0
+        self.response_wire_bytes = 0
+        self.error = None
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.start_time = time.time()
+        self.duration = 0.0
+
+    # Records one HTTP request of the call; the wire sizes default to the decoded sizes
+    def add_request(self, method, path, status, request_bytes, response_bytes, network, transfer,
+                    request_wire_bytes=None, response_wire_bytes=None):
+        self.method = method
+        self.path = path
+        self.status = status
+        self.requests += 1
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+        self.request_wire_bytes += request_bytes if request_wire_bytes is None else request_wire_bytes
+        self.response_wire_bytes += response_bytes if response_wire_bytes is None else response_wire_bytes
+        self.timings['network'] += network
+        self.timings['transfer'] += transfer
+
+    def __repr__(self):
+        return ('{}(endpoint={!r}, method={!r}, status={!r}, requests={}, request_bytes={}, response_bytes={}, '
+                'duration={:.6f}, timings={!r})'.format(self.__class__.__name__, self.endpoint, self.method, self.status,
+                                                        self.requests, self.request_bytes, self.response_bytes,
+                                                        self.duration, self.timings))
+
+
+# Returns the event of the instrumented call that runs in the current thread or asyncio task, or None
+def current_event():
+    return _current_event.get()
+
+
+# Adds the time to the phase of the current event, if there is one
+def add_timing(phase, seconds):
+    event = _current_event.get()
+    if event is not None:
+        event.timings[phase] += seconds
+
+
+# Completes the event and passes it to the listeners; a failing listener does not affect the call
+def _finish(event, listeners, started):
+    event.duration = time.perf_counter() - started
+    measured = sum(event.timings[phase] for phase in PHASES if phase != 'convert')
+    event.timings['convert'] = max(0.0, event.duration - measured)
+    for listener in listeners:
+        try:
+            listener(event)
+        except Exception:
+            logger.exception('TAGIAS metrics listener failed')
+
+
+# Decorator for the helper methods that reports their calls to the helper's listeners; a nested instrumented call
+# (e.g. a TagiasHelper2 method calling a TagiasHelper method) is reported as a part of the outer call.
+# When the helper has no listeners the method is called directly
+def instrumented(endpoint):
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(self, *args, **kwargs):
+                listeners = self._listeners
+                if not listeners or _current_event.get() is not None:
+                    return await fn(self, *args, **kwargs)
+                event = TagiasCallEvent(endpoint)
+                token = _current_event.set(event)
+                started = time.perf_counter()
+                try:
+                    return await fn(self, *args, **kwargs)
+                except Exception as e:
+                    event.error = e
+                    raise
+                finally:
+                    _current_event.reset(token)
+                    _finish(event, listeners, started)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            listeners = self._listeners
+            if not listeners or _current_event.get() is not None:
+                return fn(self, *args, **kwargs)
+            event = TagiasCallEvent(endpoint)
+            token = _current_event.set(event)
+            started = time.perf_counter()
+            try:
+                return fn(self, *args, **kwargs)
+            except Exception as e:
+                event.error = e
+                raise
+            finally:
+                _current_event.reset(token)
+                _finish(event, listeners, started)
+        return wrapper
+    return decorator
+
+
+# Listener that aggregates the calls into Prometheus metrics and renders them in the text exposition format
+# (the OpenMetrics compatible subset) without requiring the prometheus_client package
+class TagiasPrometheusCollector:
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, prefix='tagias', buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._errors = {}
+        self._request_bytes = {}
+        self._response_bytes = {}
+        self._request_wire_bytes = {}
+        self._response_wire_bytes = {}
+        self._phases = {}
+        self._histograms = {}
+
+    def __call__(self, event):
+        status = str(event.status) if event.status is not None else 'none'
+        with self._lock:
+            key = (event.endpoint, status)
+            self._calls[key] = self._calls.get(key, 0) + 1
+            if event.error is not None:
+                key = (event.endpoint, type(event.error).__name__)
+                self._errors[key] = self._errors.get(key, 0) + 1
+            self._request_bytes[event.endpoint] = self._request_bytes.get(event.endpoint, 0) + event.request_bytes
+            self._response_bytes[event.endpoint] = self._response_bytes.get(event.endpoint, 0) + event.response_bytes
+            self._request_wire_bytes[event.endpoint] = self._request_wire_bytes.get(event.endpoint, 0) + event.request_wire_bytes
+            self._response_wire_bytes[event.endpoint] = self._response_wire_bytes.get(event.endpoint, 0) + event.response_wire_bytes
+            for phase, seconds in event.timings.items():
+                key = (event.endpoint, phase)
+                self._phases[key] = self._phases.get(key, 0.0) + seconds
+            histogram = self._histograms.get(event.endpoint)
+            if histogram is None:
+                histogram = self._histograms[event.endpoint] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, event.duration)
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += event.duration
+            histogram[2] += 1
+
+    # Returns the metrics in the Prometheus text exposition format
+    def expose(self):
+        p = self.prefix
+        lines = []
+        with self._lock:
+            lines.append('# HELP {}_calls_total Number of TAGIAS API calls.'.format(p))
+            lines.append('# TYPE {}_calls_total counter'.format(p))
+            for (endpoint, status), value in sorted(self._calls.items()):
+                lines.append('{}_calls_total{{endpoint="{}",status="{}"}} {}'.format(p, endpoint, status, value))
+            lines.append('# HELP {}_errors_total Number of failed TAGIAS API calls.'.format(p))
+            lines.append('# TYPE {}_errors_total counter'.format(p))
+            for (endpoint, error), value in sorted(self._errors.items()):
+                lines.append('{}_errors_total{{endpoint="{}",error="{}"}} {}'.format(p, endpoint, error, value))
+            for name, values, help in (('request_bytes', self._request_bytes, 'Bytes sent in the request bodies.'),
+                                       ('response_bytes', self._response_bytes, 'Bytes received in the response bodies.'),
+                                       ('request_wire_bytes', self._request_wire_bytes,
+                                        'Bytes sent in the request bodies over the network (compressed).'),
+                                       ('response_wire_bytes', self._response_wire_bytes,
+                                        'Bytes received in the response bodies over the network (compressed).')):
+                lines.append('# HELP {}_{}_total {}'.format(p, name, help))
+                lines.append('# TYPE {}_{}_total counter'.format(p, name))
+                for endpoint, value in sorted(values.items()):
+                    lines.append('{}_{}_total{{endpoint="{}"}} {}'.format(p, name, endpoint, value))
+            lines.append('# HELP {}_phase_seconds_total Time spent in the phases of the TAGIAS API calls.'.format(p))
+            lines.append('# TYPE {}_phase_seconds_total counter'.format(p))
+            for (endpoint, phase), value in sorted(self._phases.items()):
+                lines.append('{}_phase_seconds_total{{endpoint="{}",phase="{}"}} {!r}'.format(p, endpoint, phase, value))
+            lines.append('# HELP {}_call_duration_seconds Duration of the TAGIAS API calls.'.format(p))
+            lines.append('# TYPE {}_call_duration_seconds histogram'.format(p))
+            for endpoint, (counts, total, count) in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, value in zip(self.buckets, counts):
+                    cumulative += value
+                    lines.append('{}_call_duration_seconds_bucket{{endpoint="{}",le="{!r}"}} {}'.format(p, endpoint, bound, cumulative))
+                lines.append('{}_call_duration_seconds_bucket{{endpoint="{}",le="+Inf"}} {}'.format(p, endpoint, count))
+                lines.append('{}_call_duration_seconds_sum{{endpoint="{}"}} {!r}'.format(p, endpoint, total))
+                lines.append('{}_call_duration_seconds_count{{endpoint="{}"}} {}'.format(p, endpoint, count))
+        return '\n'.join(lines) + '\n'
+
+
+# Listener that emits an OpenTelemetry span for every call, with the phase timings and byte counts as attributes;
+# requires the opentelemetry-api package unless a tracer is provided
+class TagiasSpanEmitter:
+    def __init__(self, tracer=None):
+        if tracer is None:
+            from opentelemetry import trace
+            tracer = trace.get_tracer('tagias')
+        self.tracer = tracer
+
+    def __call__(self, event):
+        start = int(event.start_time * 1e9)
+        span = self.tracer.start_span('tagias.' + event.endpoint, start_time=start)
+        span.set_attribute('http.request.method', event.method or '')
+        if event.status is not None:
+            span.set_attribute('http.response.status_code', event.status)
+        span.set_attribute('url.path', event.path or '')
+        span.set_attribute('tagias.requests', event.requests)
+        span.set_attribute('tagias.request_bytes', event.request_bytes)
+        span.set_attribute('tagias.response_bytes', event.response_bytes)
+        span.set_attribute('tagias.request_wire_bytes', event.request_wire_bytes)
+        span.set_attribute('tagias.response_wire_bytes', event.response_wire_bytes)
+        for phase, seconds in event.timings.items():
+            span.set_attribute('tagias.phase.{}_seconds'.format(phase), seconds)
+        if event.error is not None:
+            span.record_exception(event.error)
+            try:
+                from opentelemetry.trace import Status, StatusCode
+                span.set_status(Status(StatusCode.ERROR, str(getattr(event.error, 'code', event.error))))
+            except ImportError:
+                pass
+        span.end(end_time=start + int(event.duration * 1e9))
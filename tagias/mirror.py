@@ -0,0 +1,345 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import requests
+
+from .geometry import _box_bounds
+from .tagias import TagiasHelper, TagiasError, TagiasErrors, TagiasStatuses, TagiasTypes
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS packages (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    type TEXT,
+    status TEXT,
+    descr TEXT,
+    labels TEXT,
+    labels_required TEXT,
+    callback TEXT,
+    baseurl TEXT,
+    created TEXT,
+    started TEXT,
+    stopped TEXT,
+    finished TEXT,
+    updated TEXT,
+    delivered TEXT,
+    amount REAL,
+    pictures_num INTEGER,
+    completed_num INTEGER,
+    result_updated TEXT,
+    result_completed_num INTEGER,
+    details_synced REAL
+);
+CREATE INDEX IF NOT EXISTS packages_status ON packages (status);
+CREATE TABLE IF NOT EXISTS pictures (
+    package_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT,
+    label TEXT,
+    labels TEXT,
+    error TEXT,
+    shapes INTEGER,
+    PRIMARY KEY (package_id, name)
+);
+CREATE INDEX IF NOT EXISTS pictures_label ON pictures (label);
+CREATE INDEX IF NOT EXISTS pictures_error ON pictures (error);
+CREATE TABLE IF NOT EXISTS shapes (
+    package_id TEXT NOT NULL,
+    picture TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    type TEXT,
+    label TEXT,
+    x1 REAL,
+    y1 REAL,
+    x2 REAL,
+    y2 REAL,
+    x REAL,
+    y REAL,
+    points TEXT
+);
+CREATE INDEX IF NOT EXISTS shapes_picture ON shapes (package_id, picture);
+CREATE INDEX IF NOT EXISTS shapes_label ON shapes (label, type);
+CREATE TABLE IF NOT EXISTS operations (
+    date TEXT,
+    amount REAL,
+    note TEXT,
+    UNIQUE (date, amount, note)
+);
+CREATE INDEX IF NOT EXISTS operations_date ON operations (date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+# The results are downloaded into these connection-private tables and moved into pictures and shapes in one short
+# transaction, so the mirror is not locked for writing while a result is downloaded
+_STAGE_SCHEMA = '''
+CREATE TEMP TABLE IF NOT EXISTS stage_pictures AS SELECT * FROM main.pictures WHERE 0;
+CREATE TEMP TABLE IF NOT EXISTS stage_shapes AS SELECT * FROM main.shapes WHERE 0;
+'''
+
+_PACKAGE_COLUMNS = ('id', 'name', 'type', 'status', 'descr', 'labels', 'labels_required', 'callback', 'baseurl',
+                    'created', 'started', 'stopped', 'finished', 'updated', 'delivered', 'amount', 'pictures_num',
+                    'completed_num')
+
+
+# Returns the timestamp as an ISO string regardless of the timestamps mode of the helper
+def _timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+# Returns the value as a JSON string for the list columns
+def _json(value):
+    return json.dumps(value) if value is not None else None
+
+
+# Local SQLite mirror of the packages, their results (one row per picture and per shape) and the balance operations;
+# sync updates it incrementally: the package details are read only for the packages whose list fields have changed
+# or whose details are older than refresh_interval, and the result only for the packages whose updated or completed_num
+# has changed since it was mirrored
+class TagiasMirror:
+    # helper is a TagiasHelper or TagiasHelper2 instance; path is the database file; the results are read with
+    # get_result unless stream is True, which reads them with iter_result in constant memory but more slowly;
+    # the details of the packages that are not finished are read again every refresh_interval seconds, since
+    # the edits of their descriptions, labels or callbacks do not show in the list of packages (None turns it off)
+    def __init__(self, helper, path, batch_size=10000, max_workers=None, stream=False, refresh_interval=3600):
+        self.helper = getattr(helper, 'helper', helper)
+        self.path = path
+        self.stream = stream
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.refresh_interval = refresh_interval
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(_SCHEMA)
+        self.connection.executescript(_STAGE_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Runs the SQL query against the mirror and returns the list of rows
+    def query(self, sql, parameters=()):
+        return self.connection.execute(sql, parameters).fetchall()
+
+    # Updates the mirror and returns the statistics: the number of packages read, the package details and the results
+    # updated, and the number of pictures, shapes and new operations written; ids limits the sync to the packages
+    # with these ids, results and balance turn the mirroring of the results and the operations off
+    def sync(self, ids=None, results=True, balance=True):
+        stats = {'packages': 0, 'details': 0, 'results': 0, 'pictures': 0, 'shapes': 0, 'operations': 0, 'failed': []}
+        stored = {row[0]: row for row in self.connection.execute(
+            'SELECT {}, details_synced FROM packages'.format(', '.join(_PACKAGE_COLUMNS)))}
+
+        packages = self.helper.get_packages()
+        if ids is not None:
+            wanted = set(ids)
+            packages = [package for package in packages if package.get('id') in wanted]
+        stats['packages'] = len(packages)
+        now = time.time()
+        changed = [package.get('id') for package in packages
+                   if self._changed(stored.get(package.get('id')), package, now)]
+
+        details = []
+        for id, package in self.helper.get_packages_details(changed, self.max_workers):
+            if isinstance(package, TagiasError):
+                stats['failed'].append((id, package.code))
+                continue
+            details.append(package)
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO packages ({}, result_updated, result_completed_num, details_synced) VALUES ({}, '
+                '(SELECT result_updated FROM packages WHERE id = ?), (SELECT result_completed_num FROM packages WHERE id = ?), '
+                '?)'.format(', '.join(_PACKAGE_COLUMNS), ', '.join('?' * len(_PACKAGE_COLUMNS))),
+                [self._package_row(package) + (package.get('id'), package.get('id'), now) for package in details])
+        stats['details'] = len(details)
+
+        if results:
+            pending = self.connection.execute(
+                'SELECT id, updated, completed_num FROM packages WHERE completed_num > 0 AND '
+                '(result_updated IS NOT updated OR result_completed_num IS NOT completed_num)').fetchall()
+            mirrored = set(package.get('id') for package in packages)
+            for id, updated, completed_num in pending:
+                if id not in mirrored:
+                    continue
+                try:
+                    pictures, shapes = self._sync_result(id, updated, completed_num)
+                except TagiasError as e:
+                    stats['failed'].append((id, e.code))
+                    continue
+                except requests.RequestException:
+                    stats['failed'].append((id, TagiasErrors.CONNECTION))
+                    continue
+                stats['results'] += 1
+                stats['pictures'] += pictures
+                stats['shapes'] += shapes
+
+        if balance:
+            stats['operations'] = self._sync_balance()
+        return stats
+
+    # Returns True if the details of the package must be read: it is not mirrored yet, a field of the list entry
+    # differs from the mirrored one (every field the list returns is compared, including updated if it is there),
+    # or the package is not finished and its details were read more than refresh_interval seconds ago
+    def _changed(self, row, package, now):
+        if row is None:
+            return True
+        for position, column in enumerate(_PACKAGE_COLUMNS):
+            if column in package and column not in ('labels', 'labels_required') and \
+                    row[position] != _timestamp(package[column]):
+                return True
+        if self.refresh_interval is None or package.get('status') == TagiasStatuses.FINISHED:
+            return False
+        synced = row[len(_PACKAGE_COLUMNS)]
+        return synced is None or now - synced >= self.refresh_interval
+
+    def _package_row(self, package):
+        row = []
+        for column in _PACKAGE_COLUMNS:
+            value = package.get(column)
+            if column in ('labels', 'labels_required'):
+                value = _json(value)
+            else:
+                value = _timestamp(value)
+            row.append(value)
+        return tuple(row)
+
+    # Replaces the mirrored result of the package: the result is downloaded into the stage tables in batches and then
+    # moved into pictures and shapes in one short transaction, so the readers see either the old or the new result
+    # and the other writers are not blocked during the download
+    def _sync_result(self, id, updated, completed_num):
+        picture_count = 0
+        shape_count = 0
+        self._clear_stage()
+        try:
+            if self.stream:
+                source = self.helper.iter_result(id)
+            else:
+                source = iter(self.helper.get_result(id).get('pictures') or [])
+            while True:
+                batch = list(itertools.islice(source, self.batch_size))
+                if not batch:
+                    break
+                picture_rows = []
+                shape_rows = []
+                for picture in batch:
+                    picture_rows.append(self._picture_row(id, picture, shape_rows, self.helper.codec))
+                with self.connection:
+                    self.connection.executemany('INSERT INTO temp.stage_pictures VALUES (?, ?, ?, ?, ?, ?, ?)', picture_rows)
+                    self.connection.executemany('INSERT INTO temp.stage_shapes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                                shape_rows)
+                picture_count += len(picture_rows)
+                shape_count += len(shape_rows)
+
+            with self.connection:
+                self.connection.execute('DELETE FROM shapes WHERE package_id = ?', (id,))
+                self.connection.execute('DELETE FROM pictures WHERE package_id = ?', (id,))
+                # the later pictures replace the earlier ones with the same name
+                self.connection.execute('INSERT OR REPLACE INTO pictures SELECT * FROM temp.stage_pictures ORDER BY rowid')
+                self.connection.execute('INSERT INTO shapes SELECT * FROM temp.stage_shapes ORDER BY rowid')
+                self.connection.execute('UPDATE packages SET result_updated = ?, result_completed_num = ? WHERE id = ?',
+                                        (updated, completed_num, id))
+        finally:
+            self._clear_stage()
+        return picture_count, shape_count
+
+    def _clear_stage(self):
+        with self.connection:
+            self.connection.execute('DELETE FROM temp.stage_shapes')
+            self.connection.execute('DELETE FROM temp.stage_pictures')
+
+    # Returns the pictures table row of the picture and appends the rows of its shapes to shape_rows; the type, label and
+    # labels columns are set for the classifications, error for the errors and shapes (the number of shapes) for the shapes
+    @staticmethod
+    def _picture_row(id, picture, shape_rows, codec):
+        name = picture.get('name')
+        result = picture.get('result')
+        if isinstance(result, list):
+            for position, shape in enumerate(result):
+                resulttype = shape.get('type')
+                x1 = y1 = x2 = y2 = x = y = points = None
+                if resulttype == TagiasTypes.BoundingBoxes:
+                    x1, y1, x2, y2 = _box_bounds(shape)
+                elif resulttype == TagiasTypes.Keypoints:
+                    x, y = shape.get('x'), shape.get('y')
+                elif resulttype in (TagiasTypes.Lines, TagiasTypes.Polygons):
+                    points = codec.dumps([[p['x'], p['y']] for p in shape.get('points') or []]).decode('utf-8')
+                shape_rows.append((id, name, position, resulttype, shape.get('label'), x1, y1, x2, y2, x, y, points))
+            return id, name, None, None, None, None, len(result)
+        if result is None:
+            return id, name, None, None, None, None, None
+        if 'error' in result and 'type' not in result:
+            return id, name, None, None, None, result.get('error'), None
+        return id, name, result.get('type'), result.get('label'), _json(result.get('labels')), None, None
+
+    # Stores the balance and inserts the new operations; returns the number of the new operations
+    def _sync_balance(self):
+        balance = self.helper.get_balance()
+        with self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany('INSERT OR IGNORE INTO operations VALUES (?, ?, ?)',
+                                        [(_timestamp(operation.get('date')), operation.get('amount'), operation.get('note'))
+                                         for operation in balance.get('operations') or []])
+            added = self.connection.total_changes - before
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('balance', ?)", (str(balance.get('balance')),))
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('balance_updated', ?)",
+                                    (datetime.datetime.now(datetime.timezone.utc).isoformat(),))
+        return added
+
+
+# Adds the mirror arguments to the parser; shared by python -m tagias.mirror and the mirror command of tagias
+def add_arguments(parser):
+    parser.add_argument('database', help='path of the SQLite database file')
+    parser.add_argument('--package', action='append', dest='ids', help='mirror only this package (can be repeated)')
+    parser.add_argument('--no-results', dest='results', action='store_false', help='do not mirror the results')
+    parser.add_argument('--no-balance', dest='balance', action='store_false', help='do not mirror the balance')
+    parser.add_argument('--workers', type=int, default=None, help='concurrent package detail requests')
+    parser.add_argument('--stream', action='store_true', help='read the results in constant memory')
+    parser.add_argument('--refresh-interval', type=float, default=3600,
+                        help='read the details of the unfinished packages again after this many seconds (0: every sync)')
+
+
+# Syncs the mirror with the parsed add_arguments arguments, prints the statistics and returns the exit code
+def run(helper, args):
+    with TagiasMirror(helper, args.database, max_workers=args.workers, stream=args.stream,
+                      refresh_interval=args.refresh_interval) as mirror:
+        stats = mirror.sync(args.ids, args.results, args.balance)
+    print('packages: {packages}, details updated: {details}, results updated: {results}, pictures: {pictures}, '
+          'shapes: {shapes}, new operations: {operations}'.format(**stats))
+    for id, code in stats['failed']:
+        print('failed: {} ({})'.format(id, code), file=sys.stderr)
+    return 1 if stats['failed'] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m tagias.mirror',
+                                     description='Mirror TAGIAS packages, results and balance operations into SQLite')
+    add_arguments(parser)
+    parser.add_argument('--api-key', default=os.environ.get('TAGIAS_API_KEY'),
+                        help='TAGIAS API key (default: the TAGIAS_API_KEY environment variable)')
+    parser.add_argument('--url', default=None, help='TAGIAS API endpoint URL')
+    args = parser.parse_args(argv)
+    if not args.api_key:
+        parser.error('the API key is required (--api-key or TAGIAS_API_KEY)')
+
+    with TagiasHelper(args.api_key, url=args.url) as helper:
+        return run(helper, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+import concurrent.futures
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+import requests
+
+from .tagias import TagiasError, TagiasErrors, TagiasStatuses
+
+
+logger = logging.getLogger(__name__)
+
+# Job states: a 'pending' job creates its package ('creating' while the request is in flight), a 'created' package
+# is started, an 'active' package is polled until it is FINISHED, a 'finished' package is harvested and
+# the job becomes 'done'; a job that fails max_attempts times in a row becomes 'failed'. A job whose package is
+# neither ACTIVE nor FINISHED (STOPPED, SUSPENDED or not started) is 'paused': run(forever=True) keeps polling it
+# every max_interval seconds, and run() checks it once and continues it if the package has been started again
+PENDING = 'pending'
+CREATING = 'creating'
+CREATED = 'created'
+ACTIVE = 'active'
+FINISHED = 'finished'
+DONE = 'done'
+FAILED = 'failed'
+PAUSED = 'paused'
+
+_OPEN_STATES = (PENDING, CREATING, CREATED, ACTIVE, FINISHED)
+_CHECKED_STATES = _OPEN_STATES + (PAUSED,)
+
+# Errors that are not resolved by repeating the request, so the job fails at once
+_PERMANENT_ERRORS = frozenset((TagiasErrors.NONAME, TagiasErrors.NOPICTURES, TagiasErrors.BADPICTURES,
+                               TagiasErrors.NOLABELS, TagiasErrors.BADCALLBACK, TagiasErrors.BADBASEURL,
+                               TagiasErrors.BADTYPE, TagiasErrors.BADSTATUS, TagiasErrors.NOTFOUND,
+                               TagiasErrors.UNAUTHORIZED))
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    spec TEXT,
+    package_id TEXT,
+    status TEXT,
+    pictures_num INTEGER,
+    completed_num INTEGER,
+    checked REAL,
+    next_check REAL NOT NULL,
+    interval REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result_path TEXT,
+    created REAL,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, next_check);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_package ON jobs (package_id);
+'''
+
+_COLUMNS = ('id', 'state', 'priority', 'spec', 'package_id', 'status', 'pictures_num', 'completed_num', 'checked',
+            'next_check', 'interval', 'attempts', 'error', 'result_path', 'created', 'updated')
+
+
+# Orchestrates the lifecycle of many packages from one process: creates the packages of the submitted jobs, starts
+# them, polls their progress and harvests their results. The jobs are kept in a SQLite database, so a restarted
+# orchestrator continues where it stopped, and the due steps are taken from a time-ordered priority queue and run
+# in a thread pool of max_workers. The packages are polled between min_interval and max_interval seconds: the interval
+# follows the estimated time to completion, so the packages close to completion are polled more often, and it grows
+# while a package makes no progress
+class TagiasOrchestrator:
+    # helper is a TagiasHelper instance; path is the job database file; finished results are written as line-delimited
+    # JSON to harvest_dir (if set), and request_result asks tagias.com to deliver them to the package callback
+    def __init__(self, helper, path, max_workers=8, min_interval=30, max_interval=1800, harvest_dir=None,
+                 request_result=False, max_attempts=5):
+        self.helper = getattr(helper, 'helper', helper)
+        self.path = path
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.harvest_dir = harvest_dir
+        self.request_result = request_result
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(_SCHEMA)
+        if harvest_dir is not None:
+            os.makedirs(harvest_dir, exist_ok=True)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Adds a job that creates a package with the create_package arguments and returns the job id; the package is
+    # named package_name(job id, name) and started unless start is False, and the jobs with a higher priority
+    # are processed first when several are due
+    def submit(self, name, type, descr, labels, callback, baseurl, pictures, labels_required=None, priority=0,
+               start=True, job_id=None):
+        spec = {'name': name, 'type': type, 'descr': descr, 'labels': labels, 'callback': callback, 'baseurl': baseurl,
+                'pictures': list(pictures), 'labels_required': labels_required, 'start': start}
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO jobs (id, state, priority, spec, next_check, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, PENDING, priority, json.dumps(spec), now, now, now))
+        return job_id
+
+    # Adds a job for an existing package, which is polled and harvested; returns the job id, or the id of the job
+    # that already tracks the package
+    def track(self, package_id, priority=0, job_id=None):
+        job_id = job_id or package_id
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR IGNORE INTO jobs (id, state, priority, package_id, next_check, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', (job_id, ACTIVE, priority, package_id, now, now, now))
+        # the package may be tracked by another job already
+        row = self.connection.execute('SELECT id FROM jobs WHERE package_id = ?', (package_id,)).fetchone()
+        if row is None:
+            raise ValueError('The job {} already exists for another package'.format(job_id))
+        return row[0]
+
+    # Returns the job as a dict, or None
+    def job(self, job_id):
+        row = self.connection.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    # Returns the list of the jobs (without the package specs), optionally only in the given states
+    def jobs(self, states=None):
+        sql = 'SELECT {} FROM jobs'.format(', '.join(c for c in _COLUMNS if c != 'spec'))
+        if states:
+            sql += ' WHERE state IN ({})'.format(', '.join('?' * len(states)))
+        return [dict(row) for row in self.connection.execute(sql + ' ORDER BY created', tuple(states or ()))]
+
+    # Returns the number of jobs per state
+    def summary(self):
+        return dict(self.connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+    # Processes the due jobs until no open job remains, leaving the paused jobs as they are (or forever if forever is True, picking up the jobs
+    # submitted by other processes every poll seconds) and returns the summary; a job interrupted by a crash is resumed
+    # from its last saved state, and a 'creating' job first looks for a package that was created under its package_name
+    def run(self, forever=False, poll=5.0):
+        # the jobs ordered by the next check time, and the due jobs ordered by the priority
+        queue = []
+        ready = []
+        known = set()
+        running = {}
+        # the paused jobs are checked once at the start, and then polled only if forever is True
+        self._load(queue, known, _CHECKED_STATES, due=None if forever else time.time())
+        loaded = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                now = time.time()
+                if now - loaded >= poll:
+                    self._load(queue, known, _CHECKED_STATES if forever else _OPEN_STATES)
+                    loaded = now
+                while queue and queue[0][0] <= now:
+                    next_check, priority, job_id = heapq.heappop(queue)
+                    heapq.heappush(ready, (priority, next_check, job_id))
+                while ready and len(running) < self.max_workers:
+                    priority, _, job_id = heapq.heappop(ready)
+                    job = self.job(job_id)
+                    if job is None or job['state'] not in _CHECKED_STATES:
+                        known.discard(job_id)
+                        continue
+                    running[executor.submit(self._step, job)] = (job_id, priority)
+
+                if not running and not queue and not ready and not forever:
+                    break
+                # waits for a finished step or the next due job, whichever comes first
+                timeout = poll
+                if queue:
+                    timeout = max(0.0, min(timeout, queue[0][0] - time.time()))
+                if running:
+                    done, _ = concurrent.futures.wait(running, timeout=timeout,
+                                                      return_when=concurrent.futures.FIRST_COMPLETED)
+                else:
+                    time.sleep(timeout)
+                    done = ()
+                for future in done:
+                    job_id, priority = running.pop(future)
+                    try:
+                        changes = future.result()
+                        self._save(job_id, changes)
+                    except Exception as e:
+                        # an unexpected error (a harvest write, a bad response, the database) fails only this job
+                        logger.exception('TAGIAS job %s failed', job_id)
+                        changes = {'state': FAILED, 'error': '{}: {}'.format(TagiasErrors.UNKNOWN, e.__class__.__name__)}
+                        self._save(job_id, changes)
+                    if changes.get('state') in _OPEN_STATES or (forever and changes.get('state') == PAUSED):
+                        heapq.heappush(queue, (changes['next_check'], priority, job_id))
+                    else:
+                        known.discard(job_id)
+        return self.summary()
+
+    # Adds the jobs in the states that are not known to the scheduler yet to the queue; the paused jobs are due
+    # at the due time if it is set
+    def _load(self, queue, known, states, due=None):
+        for job_id, state, next_check, priority in self.connection.execute(
+                'SELECT id, state, next_check, priority FROM jobs WHERE state IN ({})'.format(', '.join('?' * len(states))),
+                states):
+            if job_id not in known:
+                if state == PAUSED and due is not None:
+                    next_check = min(next_check, due)
+                heapq.heappush(queue, (next_check, -priority, job_id))
+                known.add(job_id)
+
+    # Saves the changes of the job
+    def _save(self, job_id, changes):
+        changes['updated'] = time.time()
+        names = sorted(changes)
+        with self.connection:
+            self.connection.execute('UPDATE jobs SET {} WHERE id = ?'.format(', '.join(n + ' = ?' for n in names)),
+                                    [changes[n] for n in names] + [job_id])
+
+    # Takes the next step of the job and returns the changes of the job; runs in the thread pool
+    def _step(self, job):
+        try:
+            if job['state'] in (PENDING, CREATING):
+                return self._create(job)
+            if job['state'] == CREATED:
+                self.helper.set_package_status(job['package_id'], TagiasStatuses.ACTIVE)
+                return {'state': ACTIVE, 'next_check': time.time() + self.min_interval, 'attempts': 0, 'error': None}
+            if job['state'] in (ACTIVE, PAUSED):
+                return self._check(job)
+            return self._harvest(job)
+        except (TagiasError, requests.RequestException) as e:
+            code = e.code if isinstance(e, TagiasError) else TagiasErrors.CONNECTION
+            attempts = job['attempts'] + 1
+            logger.warning('TAGIAS job %s failed in state %s: %s', job['id'], job['state'], code)
+            if attempts >= self.max_attempts or code in _PERMANENT_ERRORS:
+                return {'state': FAILED, 'attempts': attempts, 'error': code}
+            # a package creation that may have reached the server is resolved by name on the next attempt
+            state = CREATING if job['state'] in (PENDING, CREATING) else job['state']
+            delay = min(self.max_interval, self.min_interval * 2 ** (attempts - 1))
+            return {'state': state, 'attempts': attempts, 'error': code, 'next_check': time.time() + delay}
+
+    # Returns the name of the package of the job: the package names are not unique, so the job id is appended
+    # to find the package of this very job after a crash
+    @staticmethod
+    def package_name(job_id, name):
+        return '{} [{}]'.format(name, job_id)
+
+    def _create(self, job):
+        spec = json.loads(job['spec'])
+        name = self.package_name(job['id'], spec['name'])
+        package_id = None
+        if job['state'] == CREATING:
+            # the previous attempt may have created the package before it failed or the process stopped
+            owned = self._owned_packages()
+            for package in self.helper.get_packages():
+                if package.get('name') == name and package.get('id') not in owned:
+                    package_id = package.get('id')
+                    break
+        else:
+            # the state is saved before the request, so a crash during the request is detected by the next run
+            self._mark_creating(job['id'])
+        if package_id is None:
+            package = self.helper.create_package(name, spec['type'], spec['descr'], spec['labels'],
+                                                 spec['callback'], spec['baseurl'], spec['pictures'],
+                                                 spec['labels_required'])
+            package_id = package['id']
+        # the picture list is not needed anymore
+        spec['pictures'] = None
+        return {'state': CREATED if spec['start'] else ACTIVE, 'package_id': package_id, 'spec': json.dumps(spec),
+                'next_check': time.time(), 'attempts': 0, 'error': None}
+
+    # Saves the 'creating' state with a separate connection, since it is called from the thread pool
+    def _mark_creating(self, job_id):
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                connection.execute('UPDATE jobs SET state = ?, updated = ? WHERE id = ?', (CREATING, time.time(), job_id))
+        finally:
+            connection.close()
+
+    # Returns the set of the package ids that belong to the jobs, read with a separate connection like _mark_creating
+    def _owned_packages(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            return set(row[0] for row in connection.execute('SELECT package_id FROM jobs WHERE package_id IS NOT NULL'))
+        finally:
+            connection.close()
+
+    def _check(self, job):
+        package = self.helper.get_package(job['package_id'])
+        now = time.time()
+        status = package.get('status')
+        completed = package.get('completed_num') or 0
+        total = package.get('pictures_num') or 0
+        changes = {'state': ACTIVE, 'status': status, 'completed_num': completed, 'pictures_num': total, 'checked': now,
+                   'attempts': 0, 'error': None}
+        if status == TagiasStatuses.FINISHED:
+            changes.update(state=FINISHED, next_check=now)
+            return changes
+        if status != TagiasStatuses.ACTIVE:
+            # a stopped, suspended or not started package makes no progress until it is started again
+            changes.update(state=PAUSED, next_check=now + self.max_interval)
+            return changes
+        changes['interval'] = interval = self._interval(job, completed, total, now)
+        changes['next_check'] = now + interval
+        return changes
+
+    # Returns the polling interval: a quarter of the estimated time to completion at the progress rate since
+    # the previous check, or the previous interval doubled if there was no progress
+    def _interval(self, job, completed, total, now):
+        previous = job['interval'] or self.min_interval
+        if job['checked'] is None or job['completed_num'] is None:
+            return self.min_interval
+        progress = completed - job['completed_num']
+        if progress <= 0:
+            return min(self.max_interval, previous * 2)
+        rate = progress / max(now - job['checked'], 1e-3)
+        eta = max(total - completed, 0) / rate
+        return min(self.max_interval, max(self.min_interval, eta / 4))
+
+    def _harvest(self, job):
+        package_id = job['package_id']
+        changes = {'state': DONE, 'attempts': 0, 'error': None}
+        if self.request_result:
+            self.helper.request_result(package_id)
+        if self.harvest_dir is not None:
+            from .export import export_jsonl
+            path = os.path.join(self.harvest_dir, '{}.jsonl'.format(package_id))
+            tmp = path + '.tmp'
+            export_jsonl(self.helper.iter_result(package_id), tmp, codec=self.helper.codec)
+            os.replace(tmp, path)
+            changes['result_path'] = path
+        return changes
@@ -0,0 +1,71 @@
+import concurrent.futures
+import gc
+import itertools
+import os
+
+from .codec import get_codec
+from .columnar import _source_pictures
+from .tagias import TagiasPictureResult
+
+
+# Converts the pictures of the encoded shard and applies the function to them; runs in the worker processes
+def _map_shard(fn, data, codec, keep_raw):
+    # decoding allocates millions of acyclic objects, which would otherwise trigger repeated full collections
+    # of the worker heap inherited from the parent process
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return [fn(TagiasPictureResult(picture, cache=False, keep_raw=keep_raw)) for picture in codec.loads(data)]
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# Applies fn to a TagiasPictureResult of every picture of the result (a TagiasResult instance, a get_result dict
+# or a list of picture dicts) and returns the list of the values in the order of the pictures. The pictures are split
+# into shards that are sent to a process pool as compact JSON bytes encoded with the codec (see tagias.codec),
+# converted and processed there, so only the source JSON and the values returned by fn cross the process boundary;
+# fn must be picklable (a module-level function) and should return compact values (numbers, tuples, small dicts)
+# rather than the converted objects. Results with fewer than threshold pictures (and all the results on a single CPU)
+# are processed in the current process
+def map_pictures(fn, result, max_workers=None, threshold=20000, shard_size=None, codec=None, keep_raw=False,
+                 executor=None):
+    own_executor = executor is None
+    if own_executor and len(_source_pictures(result)) >= threshold and (max_workers or os.cpu_count() or 1) >= 2:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        return _collect(_submit(fn, result, max_workers, threshold, shard_size, codec, keep_raw, executor))
+    finally:
+        if own_executor and executor is not None:
+            executor.shutdown()
+
+
+# Applies fn to the pictures of several results (e.g. of the finished packages) in one process pool and
+# returns the list of the value lists in the order of the results (see map_pictures); the shards of all the results
+# are submitted at once, so the small results are processed while the large ones are still running
+def map_results(fn, results, max_workers=None, threshold=20000, shard_size=None, codec=None, keep_raw=False):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = [_submit(fn, result, max_workers, threshold, shard_size, codec, keep_raw, executor)
+                   for result in results]
+        return [_collect(parts) for parts in pending]
+
+
+# Submits the shards of the result to the executor and returns the list of the futures, or processes the result
+# in the current process if it has fewer than threshold pictures and returns its values as the only part
+def _submit(fn, result, max_workers, threshold, shard_size, codec, keep_raw, executor):
+    pictures = _source_pictures(result)
+    workers = max_workers or os.cpu_count() or 1
+    if len(pictures) < threshold or workers < 2:
+        return [[fn(TagiasPictureResult(picture, cache=False, keep_raw=keep_raw)) for picture in pictures]]
+    codec = get_codec(codec)
+    if shard_size is None:
+        # a few shards per worker keep the workers busy when the pictures differ in size
+        shard_size = max(1, -(-len(pictures) // (workers * 4)))
+    return [executor.submit(_map_shard, fn, codec.dumps(pictures[start:start + shard_size]), codec, keep_raw)
+            for start in range(0, len(pictures), shard_size)]
+
+
+# Returns the values of the submitted parts in order
+def _collect(parts):
+    return list(itertools.chain.from_iterable(
+        part.result() if isinstance(part, concurrent.futures.Future) else part for part in parts))
@@ -0,0 +1,128 @@
+import concurrent.futures
+import threading
+import time
+import urllib.parse
+
+import requests
+import requests.adapters
+
+
+# Pre-flight validator of the picture URLs of a new package: checks that every baseurl + picture URL is well-formed and
+# reachable before create_package, so a package with a bad picture fails fast instead of with BADPICTURES after
+# the whole list was uploaded. The URLs are checked in parallel with pooled HEAD requests (falling back to a one-byte
+# range GET for the servers that do not support HEAD), with at most max_workers requests in total and per_host
+# requests per host; the outcome of every URL is cached for ttl seconds (error_ttl seconds for the bad URLs,
+# so a temporary failure is checked again soon)
+class TagiasPictureValidator:
+    def __init__(self, max_workers=32, per_host=8, timeout=10, ttl=3600, error_ttl=60, content_types=('image/',),
+                 session=None):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        # the accepted Content-Type prefixes; None accepts any content type
+        self.content_types = tuple(content_types) if content_types else None
+        self._owns_session = session is None
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self._lock = threading.Lock()
+        # url -> (expiration time, error or None)
+        self._cache = {}
+        self._hosts = {}
+
+    def close(self):
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Returns the URL of the picture: the picture itself if it is an absolute URL, otherwise baseurl + picture
+    @staticmethod
+    def picture_url(baseurl, picture):
+        if baseurl is None or urllib.parse.urlsplit(picture).scheme:
+            return picture
+        return baseurl + picture
+
+    # Returns the semaphore that limits the concurrent requests to the host
+    def _host_semaphore(self, host):
+        with self._lock:
+            semaphore = self._hosts.get(host)
+            if semaphore is None:
+                semaphore = self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return semaphore
+
+    # Returns None if the URL is a reachable picture, otherwise the reason why it is not
+    def check(self, url):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(url)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        error = self._check(url)
+        with self._lock:
+            self._cache[url] = (time.monotonic() + (self.ttl if error is None else self.error_ttl), error)
+        return error
+
+    def _check(self, url):
+        try:
+            parts = urllib.parse.urlsplit(url)
+        except ValueError:
+            return 'malformed URL'
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            return 'malformed URL'
+
+        with self._host_semaphore(parts.netloc.lower()):
+            try:
+                resp = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+                if resp.status_code in (403, 405, 501):
+                    # some servers (and presigned URLs) do not allow HEAD, the first byte is requested instead
+                    resp = self.session.get(url, timeout=self.timeout, headers={'Range': 'bytes=0-0'}, stream=True)
+                    resp.close()
+            except requests.RequestException as e:
+                return 'connection error: {}'.format(e.__class__.__name__)
+        if resp.status_code not in (200, 206):
+            return 'HTTP {}'.format(resp.status_code)
+        content_type = resp.headers.get('Content-Type')
+        if self.content_types is not None and content_type and not content_type.lower().startswith(self.content_types):
+            return 'unexpected content type {}'.format(content_type)
+        return None
+
+    # Checks the pictures and returns the list of the bad ones as {'picture', 'url', 'error'} dicts in the order
+    # of the pictures; an empty list means the pictures can be submitted
+    def validate(self, baseurl, pictures):
+        pictures = list(pictures)
+        urls = dict.fromkeys(self.picture_url(baseurl, picture) for picture in pictures)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            errors = dict(zip(urls, executor.map(self.check, urls)))
+        bad = []
+        for picture in pictures:
+            url = self.picture_url(baseurl, picture)
+            if errors[url] is not None:
+                bad.append({'picture': picture, 'url': url, 'error': errors[url]})
+        return bad
+
+    # Removes the cached outcomes, or only the expired ones
+    def clear(self, expired_only=False):
+        now = time.monotonic()
+        with self._lock:
+            if expired_only:
+                self._cache = {url: value for url, value in self._cache.items() if value[0] > now}
+            else:
+                self._cache.clear()
+
+
+# Checks the pictures of a new package with a temporary TagiasPictureValidator and returns the bad ones
+# (see TagiasPictureValidator.validate)
+def validate_pictures(baseurl, pictures, **options):
+    with TagiasPictureValidator(**options) as validator:
+        return validator.validate(baseurl, pictures)
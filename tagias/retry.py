@@ -0,0 +1,84 @@
+import email.utils
+import random
+import threading
+import time
+
+
+# Retry policy of the TAGIAS helpers: the number of retries, the exponential backoff with jitter
+# and the HTTP status codes that are retried
+class TagiasRetry:
+    def __init__(self, total=3, backoff_factor=0.5, max_backoff=30.0, jitter=True,
+                 statuses=(429, 500, 502, 503, 504), respect_retry_after=True):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.respect_retry_after = respect_retry_after
+
+    # Returns True if the failed attempt (counted from 0) may be retried; status_code is None for a connection error.
+    # Requests that are not idempotent (create_package) are retried only if the server could not have processed them:
+    # on 429 throttling or when the caller knows the request was not sent
+    def is_retryable(self, status_code, idempotent, attempt):
+        if attempt >= self.total:
+            return False
+        if status_code is None:
+            return idempotent
+        if status_code == 429:
+            return True
+        return idempotent and status_code in self.statuses
+
+    # Returns the number of seconds to wait before retrying the failed attempt (counted from 0);
+    # the Retry-After response header value takes precedence over the exponential backoff
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None and self.respect_retry_after:
+            seconds = _parse_retry_after(retry_after)
+            if seconds is not None:
+                return seconds
+        backoff = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+        return backoff
+
+
+# Converts the Retry-After header value (a number of seconds or an HTTP date) to a number of seconds
+def _parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+# Thread-safe token bucket rate limiter; one instance can be shared by several helpers and threads
+# to keep all their requests under the rate (requests per second) with bursts of up to burst requests
+class TagiasRateLimiter:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else max(1.0, self.rate)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Takes one token and returns the number of seconds the caller has to wait before sending the request
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    # Takes one token and sleeps until the request may be sent
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,107 @@
+import codecs
+import json
+import re
+
+
+_WHITESPACE = re.compile(r'\s*')
+_DECODER = json.JSONDecoder()
+
+
+# Incremental reader of JSON text from an iterable of bytes or str chunks; only the not yet consumed
+# part of the text is kept in the buffer
+class _JsonStream:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    # Drops the consumed text and appends the next chunk to the buffer; returns False at the end of the stream
+    def fill(self):
+        if self.eof:
+            return False
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                self.buf = self.buf[self.pos:] + text
+                self.pos = 0
+                return True
+        self.eof = True
+        text = self._decoder.decode(b'', final=True)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return bool(text)
+
+    # Skips the whitespace and returns the next character without consuming it ('' at the end of the stream)
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    # Consumes the expected character
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('Expected {!r} at position {} of the JSON stream'.format(char, self.pos))
+        self.pos += 1
+
+    # Decodes the JSON value that starts at the current position and moves past it; returns the value and its text.
+    # The value is found and decoded by the C scanner of the json module; a value that is cut by the end of the buffer
+    # fails to decode (or ends at the end of the buffer, like a cut number) and is decoded again once the buffer
+    # has at least doubled, so a value that spans many chunks is not scanned once per chunk
+    def read_value(self):
+        self.peek()
+        while True:
+            size = len(self.buf) - self.pos
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+            else:
+                if end < len(self.buf) or self.eof:
+                    text = self.buf[self.pos:end]
+                    self.pos = end
+                    return value, text
+            while len(self.buf) - self.pos < 2 * size:
+                if not self.fill():
+                    break
+
+
+# Incrementally parses a JSON object read from the chunks iterable and yields the decoded items
+# of its top-level array attribute key one at a time, so the whole array is never held in memory;
+# the other top-level attributes are decoded into the header dict as they are read. The values are
+# decoded by the json module while they are read; loads (e.g. the loads of a tagias.codec codec) decodes
+# the text of every item and header value again instead, which only pays off for a loads with other semantics
+def iter_json_array(chunks, key, header, loads=None):
+    stream = _JsonStream(chunks)
+    stream.expect('{')
+    while True:
+        char = stream.peek()
+        if char == '}':
+            return
+        if char == ',':
+            stream.pos += 1
+            continue
+        if char == '':
+            raise ValueError('Unexpected end of the JSON stream')
+        name, _ = stream.read_value()
+        stream.expect(':')
+        if name == key and stream.peek() == '[':
+            stream.pos += 1
+            while True:
+                char = stream.peek()
+                if char == ']':
+                    stream.pos += 1
+                    break
+                if char == ',':
+                    stream.pos += 1
+                    continue
+                value, text = stream.read_value()
+                yield value if loads is None else loads(text)
+        else:
+            value, text = stream.read_value()
+            header[name] = value if loads is None else loads(text)
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .codec import get_codec
+from .tagias import TagiasPictureResult
+
+
+# Incremental synchronization of package results: remembers the pictures that were already seen for every package
+# (their names and result hashes, persisted in the <path> directory) and yields only the newly completed or changed
+# pictures. The result is not downloaded at all while completed_num and updated of the package stay the same
+class TagiasResultSync:
+    # helper is a TagiasHelper or TagiasHelper2 instance; codec is the JSON codec for the state files (see tagias.codec);
+    # the progress of a sync is saved every checkpoint seconds (None saves it only at the end)
+    def __init__(self, helper, path, keep_raw=False, codec=None, checkpoint=10.0):
+        self.helper = getattr(helper, 'helper', helper)
+        self.path = path
+        self.keep_raw = keep_raw
+        self.codec = get_codec(codec)
+        self.checkpoint = checkpoint
+        # statistics of the last sync call: the number of new, changed and unchanged pictures and
+        # whether the download was skipped
+        self.last_stats = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    # Returns the state file path for the package id
+    def _file(self, id):
+        return os.path.join(self.path, hashlib.sha1(id.encode('utf-8')).hexdigest() + '.state')
+
+    # Returns the saved state ({'id', 'completed_num', 'updated', 'pictures'}) of the package or None
+    def state(self, id):
+        try:
+            with open(self._file(id), 'rb') as f:
+                return self.codec.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    # Writes the state of the package atomically
+    def _save(self, id, state):
+        filename = self._file(id)
+        tmp = '{}.{}.{}.tmp'.format(filename, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as f:
+            f.write(self.codec.dumps(state))
+        os.replace(tmp, filename)
+
+    # Forgets the state of the package, so the next sync yields all its completed pictures again
+    def reset(self, id):
+        try:
+            os.remove(self._file(id))
+        except OSError:
+            pass
+
+    # Returns the hash of the canonical JSON of the picture result, which does not depend on the codec
+    @staticmethod
+    def _hash(result):
+        return hashlib.sha1(json.dumps(result, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    # Yields TagiasPictureResult instances for the pictures of the package that were completed or changed since
+    # the previous sync; the package properties are read first and the result is not downloaded if its completed_num
+    # and updated have not changed (unless force is True). A picture is remembered once the next one is requested,
+    # and the remembered pictures are saved every checkpoint seconds and when the sync is interrupted, so the next sync
+    # downloads the result again but yields only the pictures that were not consumed
+    def sync(self, id, force=False):
+        package = self.helper.get_package(id)
+        completed_num = package.get('completed_num')
+        updated = package.get('updated')
+        updated = str(updated) if updated is not None else None
+        state = self.state(id)
+        if state is None:
+            state = {'id': id, 'completed_num': None, 'updated': None, 'pictures': {}}
+        stats = {'new': 0, 'changed': 0, 'unchanged': 0, 'skipped': False}
+        if not force and state['completed_num'] == completed_num and state['updated'] == updated:
+            stats['skipped'] = True
+            self.last_stats = stats
+            return
+
+        seen = state['pictures']
+        # the number of the pictures remembered since the state was last saved, and the time it was saved
+        unsaved = 0
+        saved = time.monotonic()
+        completed = False
+        try:
+            for picture in self.helper.iter_result(id):
+                result = picture.get('result')
+                if result is None:
+                    continue
+                name = picture.get('name')
+                digest = self._hash(result)
+                previous = seen.get(name)
+                if previous == digest:
+                    stats['unchanged'] += 1
+                    continue
+                stats['new' if previous is None else 'changed'] += 1
+                yield TagiasPictureResult(picture, keep_raw=self.keep_raw)
+                seen[name] = digest
+                unsaved += 1
+                if self.checkpoint is not None and time.monotonic() - saved >= self.checkpoint:
+                    # completed_num and updated are saved only at the end, so the next sync still reads the result
+                    with self._lock:
+                        self._save(id, state)
+                    unsaved = 0
+                    saved = time.monotonic()
+            completed = True
+        finally:
+            if completed:
+                state['completed_num'] = completed_num
+                state['updated'] = updated
+            if completed or unsaved:
+                with self._lock:
+                    self._save(id, state)
+            self.last_stats = stats
+
+    # Returns the list of the new and changed pictures of the package (see sync)
+    def sync_all(self, id, force=False):
+        return list(self.sync(id, force))
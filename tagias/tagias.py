@@ -1,5 +1,19 @@
 import requests
+import requests.adapters
 import datetime
+import functools
+import concurrent.futures
+import hashlib
+import itertools
+import time
+from collections.abc import MutableSequence
+
+from .stream import iter_json_array
+from .cache import TagiasResultCache
+from .codec import get_codec
+from .compression import TagiasCompression
+from .metrics import instrumented, current_event
+from .retry import TagiasRetry, TagiasRateLimiter
 
 
 # Enum for project types
@@ -36,6 +50,37 @@ class TagiasErrors:
     UNAUTHORIZED = 'UNAUTHORIZED'
     UNKNOWN = 'UNKNOWN'
     BADRESULTTYPE = 'BADRESULTTYPE'
+    CONNECTION = 'CONNECTION'
+
+
+# Converts the string in ISO format to naive UTC datetime; the 'YYYY-MM-DDTHH:MM:SS.ffffffZ' strings returned by
+# the API are decoded by slicing the fixed positions instead of strptime, and the repeated values are memoized.
+# The other strings are left to strptime, so the same strings are accepted and rejected as with strptime alone
+@functools.lru_cache(maxsize=4096)
+def _parse_datetime(s):
+    if s is None:
+        return None
+    if (21 < len(s) <= 27 and s[-1] == 'Z' and s[4] == '-' and s[7] == '-' and s[10] == 'T' and s[13] == ':'
+            and s[16] == ':' and s[19] == '.'
+            and (s[0:4] + s[5:7] + s[8:10] + s[11:13] + s[14:16] + s[17:19] + s[20:-1]).isdecimal()):
+        try:
+            return datetime.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]),
+                                     int(s[17:19]), int(s[20:-1].ljust(6, '0')))
+        except ValueError:
+            pass
+    return datetime.datetime.strptime(s, '%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+# Converts the string in ISO format to timezone-aware UTC datetime
+@functools.lru_cache(maxsize=4096)
+def _parse_datetime_aware(s):
+    value = _parse_datetime(s)
+    return value.replace(tzinfo=datetime.timezone.utc) if value is not None else None
+
+
+# Keeps the string in ISO format as it is
+def _keep_timestamp(s):
+    return s
 
 
 # TAGIAS error class that contains a code and a message for the thrown error
@@ -73,41 +118,90 @@ class TagiasError(Exception):
             return 'TAGIAS API Key is incorrect'
         elif code == TagiasErrors.UNKNOWN:
             return 'Unknown response received'
+        elif code == TagiasErrors.CONNECTION:
+            return 'The TAGIAS API could not be reached'
         else:
             return 'HTTP error code returned'
 
 
-# TAGIAS helper class
-class TagiasHelper:
+# Returns the number of the body bytes of the response received from the network before decompression
+def _wire_bytes(resp, default):
+    try:
+        return resp.raw.tell()
+    except (AttributeError, OSError, ValueError):
+        return default
+
+
+# Yields the chunks and appends their sizes to the list
+def _counted(chunks, sizes):
+    for chunk in chunks:
+        sizes.append(len(chunk))
+        yield chunk
+
+
+# Base class for the TAGIAS helpers with the transport independent logic shared by the sync and async clients
+class _TagiasHelperBase:
     # URL for the TAGIAS external API endpoint
     _TAGIAS_URL = 'https://p.tagias.com/api/v2/tagias'
 
-    # Saves the provided API key for using it in subsequent method calls
-    def __init__(self, apiKey):
+    # HTTP methods that are safe to retry
+    _IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'PATCH', 'DELETE'))
+
+    # Timestamp conversion functions for the timestamps argument
+    _TIMESTAMP_PARSERS = {'naive': _parse_datetime, 'aware': _parse_datetime_aware, 'raw': _keep_timestamp}
+
+    # Saves the provided API key for using it in subsequent method calls; retry is a TagiasRetry policy
+    # (True for the default policy, False or None to disable retries), rate_limiter is an optional
+    # TagiasRateLimiter instance that may be shared with other helpers, and timestamps selects how the timestamps
+    # are returned: 'naive' UTC datetime (default), timezone-'aware' UTC datetime or 'raw' ISO strings;
+    # json_codec selects the JSON codec for the request and response bodies (see tagias.codec.get_codec);
+    # url replaces the TAGIAS external API endpoint (e.g. for a local test server); listeners are the callables
+    # that receive a tagias.metrics.TagiasCallEvent after every method call
+    def __init__(self, apiKey, retry=True, rate_limiter=None, timestamps='naive', json_codec=None, url=None, listeners=None):
         if not apiKey:
             raise TagiasError(TagiasErrors.NOAPIKEY)
 
         self.apiKey = apiKey
         self.headers = {'Content-Type': 'application/json', 'Authorization': 'Api-Key ' + self.apiKey}
-
-    # Verifies the returned status code and status attribute; raises a TagiasError exception in case of error
-    def _handle_response(self, resp):
-        if resp.status_code == 200:
-            json = resp.json()
+        if retry is True:
+            retry = TagiasRetry()
+        self.retry = retry or None
+        self.rate_limiter = rate_limiter
+        if timestamps not in self._TIMESTAMP_PARSERS:
+            raise ValueError('timestamps must be one of: {}'.format(', '.join(sorted(self._TIMESTAMP_PARSERS))))
+        self.timestamps = timestamps
+        self._parse_timestamp = self._TIMESTAMP_PARSERS[timestamps]
+        self.codec = get_codec(json_codec)
+        if url is not None:
+            self._TAGIAS_URL = url.rstrip('/')
+        self._listeners = list(listeners or ())
+
+    # Adds the listener that receives a tagias.metrics.TagiasCallEvent after every method call
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    # Removes the listener
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    # Verifies the returned status code and the status attribute of the decoded JSON body (only passed for 200 responses);
+    # raises a TagiasError exception in case of error
+    def _check_response(self, status_code, json):
+        if status_code == 200:
             if json['status'] == 'ok':
                 return json
             else:
                 raise TagiasError(json['error'])
-        elif resp.status_code == 401:
+        elif status_code == 401:
             raise TagiasError(TagiasErrors.UNAUTHORIZED)
         else:
-            raise TagiasError(str(resp.status_code))
+            raise TagiasError(str(status_code))
 
     # Converts the string in ISO format to datetime
     def _to_datetime(self, s):
         if s is None:
             return None
-        return datetime.datetime.strptime(s, '%Y-%m-%dT%H:%M:%S.%fZ')
+        return self._parse_timestamp(s)
 
     # Converts the 'created' attribute to datetime
     def _created_to_datetime(self, package):
@@ -119,16 +213,9 @@ class TagiasHelper:
         op['date'] = self._to_datetime(op['date'])
         return op
 
-    # Returns the array of created packages
-    def get_packages(self):
-        resp = requests.get(self._TAGIAS_URL + '/packages', headers=self.headers)
-        json = self._handle_response(resp)
-        packages = list(map(self._created_to_datetime, json['packages']))
-        return packages
-
-    # Creates a new TAGIAS package for annotation
-    def create_package(self, name, type, descr, labels, callback, baseurl, pictures, labels_required = None):
-        data = {
+    # Builds the request body for a new TAGIAS package
+    def _package_data(self, name, type, descr, labels, callback, baseurl, pictures, labels_required):
+        return {
             'name': name,
             'type': type,
             'descr': descr,
@@ -138,21 +225,17 @@ class TagiasHelper:
             'pictures': pictures,
             'labels_required': labels_required
         }
-        resp = requests.post(self._TAGIAS_URL + '/packages', json=data, headers=self.headers)
-        json = self._handle_response(resp)
 
-        return {'id': json['id'], 'pictures_num': json['pictures_num']}
+    # Converts the get_packages response
+    def _convert_packages(self, json):
+        return list(map(self._created_to_datetime, json['packages']))
 
-    # Modifies the TAGIAS package's status
-    def set_package_status(self, id, status):
-        resp = requests.patch(self._TAGIAS_URL + '/packages/' + id, json={'status': status}, headers=self.headers)
-        self._handle_response(resp)
-        return
+    # Converts the create_package response
+    def _convert_new_package(self, json):
+        return {'id': json['id'], 'pictures_num': json['pictures_num']}
 
-    # Reads the TAGIAS package's properties
-    def get_package(self, id):
-        resp = requests.get(self._TAGIAS_URL + '/packages/' + id, headers=self.headers)
-        json = self._handle_response(resp)
+    # Converts the get_package response
+    def _convert_package(self, json):
         package = json['package']
         package['created'] = self._to_datetime(package['created'])
         package['started'] = self._to_datetime(package['started'])
@@ -162,31 +245,369 @@ class TagiasHelper:
         package['delivered'] = self._to_datetime(package['delivered'])
         return package
 
+    # Converts the get_result response
+    def _convert_result(self, json):
+        json['finished'] = self._to_datetime(json['finished'])
+        json.pop('status', None)
+        return json
+
+    # Converts the get_balance response
+    def _convert_balance(self, json):
+        json['operations'] = list(map(self._date_to_datetime, json['operations']))
+        json.pop('status', None)
+        return json
+
+
+# TAGIAS helper class
+class TagiasHelper(_TagiasHelperBase):
+    # Saves the provided API key for using it in subsequent method calls and creates
+    # a connection-pooled HTTP session that is reused by all of them; cache is an optional
+    # TagiasResultCache instance (or a directory path for it) used by get_result; compression is an optional
+    # TagiasCompression instance (True for the default settings) that compresses the request bodies,
+    # negotiates the response encoding and counts the wire and decoded bytes
+    def __init__(self, apiKey, pool_size=10, keep_alive=True, timeout=None, session=None, cache=None,
+                 retry=True, rate_limiter=None, timestamps='naive', json_codec=None, url=None, listeners=None,
+                 compression=None):
+        super().__init__(apiKey, retry, rate_limiter, timestamps, json_codec, url, listeners)
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+        if compression is True:
+            compression = TagiasCompression()
+        self.compression = compression or None
+        if self.compression is not None:
+            self.headers['Accept-Encoding'] = self.compression.accept_encoding
+        # timeout is either a number of seconds or a (connect, read) tuple applied to every request
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        # the session is closed by close() only if it was created by the helper itself
+        self._owns_session = session is None
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+        if isinstance(cache, str):
+            cache = TagiasResultCache(cache, codec=self.codec)
+        self.cache = cache
+
+    # Closes the pooled connections of the owned HTTP session
+    def close(self):
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Sends the HTTP request to the specified TAGIAS API path using the pooled session; headers are added to the default ones.
+    # The json body is encoded with the helper's codec; the request waits for the rate limiter and is retried according
+    # to the retry policy; idempotent defaults to True for all methods except POST. With compression the body is
+    # compressed if it is large enough
+    def _request(self, method, path, headers=None, idempotent=None, json=None, **kwargs):
+        if json is not None:
+            kwargs['data'] = self.codec.dumps(json)
+        data = kwargs.get('data')
+        request_size = len(data) if data is not None else 0
+        if self.compression is not None and data is not None:
+            kwargs['data'], encoding = self.compression.encode(data)
+            if encoding is not None:
+                headers = dict(headers or {}, **{'Content-Encoding': encoding})
+        if headers:
+            headers = dict(self.headers, **headers)
+        else:
+            headers = self.headers
+        if idempotent is None:
+            idempotent = method in self._IDEMPOTENT_METHODS
+        event = current_event()
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self._sleep(self.rate_limiter.reserve(), event)
+            started = time.perf_counter()
+            try:
+                resp = self.session.request(method, self._TAGIAS_URL + path, headers=headers, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # a request that timed out while connecting has never been sent, so it is safe to retry in any case
+                if self.retry is None or not self.retry.is_retryable(None, idempotent or isinstance(e, requests.ConnectTimeout), attempt):
+                    raise
+                delay = self.retry.delay(attempt)
+            else:
+                if event is not None or self.compression is not None:
+                    self._record_request(event, method, path, kwargs, request_size, resp, time.perf_counter() - started)
+                if self.retry is None or resp.status_code < 400 or not self.retry.is_retryable(resp.status_code, idempotent, attempt):
+                    return resp
+                delay = self.retry.delay(attempt, resp.headers.get('Retry-After'))
+                resp.close()
+            attempt += 1
+            self._sleep(delay, event)
+
+    # Sleeps for the delay and adds it to the 'queue' phase of the instrumented call
+    def _sleep(self, delay, event):
+        if delay > 0:
+            time.sleep(delay)
+            if event is not None:
+                event.timings['queue'] += delay
+
+    # Adds the request to the instrumented call and to the compression statistics; the time until the response headers
+    # are received is the 'network' phase and the rest of the request is the 'transfer' phase (a streamed body is read
+    # by the caller later, so only its Content-Length is known here)
+    def _record_request(self, event, method, path, kwargs, request_size, resp, elapsed):
+        data = kwargs.get('data')
+        request_wire_bytes = len(data) if data is not None else 0
+        if kwargs.get('stream'):
+            response_bytes = response_wire_bytes = int(resp.headers.get('Content-Length') or 0)
+        else:
+            response_bytes = len(resp.content)
+            response_wire_bytes = _wire_bytes(resp, response_bytes)
+        if self.compression is not None:
+            self.compression.add_request(request_size, request_wire_bytes)
+            if not kwargs.get('stream'):
+                self.compression.add_response(response_bytes, response_wire_bytes)
+        if event is not None:
+            network = min(elapsed, resp.elapsed.total_seconds())
+            event.add_request(method, path, resp.status_code, request_size, response_bytes, network, elapsed - network,
+                              request_wire_bytes, response_wire_bytes)
+
+    # Verifies the returned status code and status attribute; raises a TagiasError exception in case of error
+    def _handle_response(self, resp):
+        if resp.status_code != 200:
+            return self._check_response(resp.status_code, None)
+        event = current_event()
+        if event is None:
+            return self._check_response(200, self.codec.loads(resp.content))
+        started = time.perf_counter()
+        json = self.codec.loads(resp.content)
+        event.timings['decode'] += time.perf_counter() - started
+        return self._check_response(200, json)
+
+    # Calls fn for every id in a bounded thread pool and yields (id, value) pairs in the order of completion;
+    # a failed call yields a TagiasError as the value instead of aborting the whole batch (UNKNOWN with
+    # the original exception as its __cause__ for the failures other than the API and connection errors)
+    def _fetch_many(self, fn, ids, max_workers):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or self.pool_size)
+        futures = {}
+        try:
+            for id in ids:
+                futures[executor.submit(fn, id)] = id
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    value = future.result()
+                except TagiasError as e:
+                    value = e
+                except requests.RequestException:
+                    value = TagiasError(TagiasErrors.CONNECTION)
+                except Exception as e:
+                    # e.g. a response body that is not JSON or a failed cache write
+                    value = TagiasError(TagiasErrors.UNKNOWN)
+                    value.__cause__ = e
+                yield futures[future], value
+        finally:
+            # the consumer may stop iterating early, so the calls that have not started yet are dropped
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    # Returns the array of created packages
+    @instrumented('get_packages')
+    def get_packages(self):
+        resp = self._request('GET', '/packages')
+        json = self._handle_response(resp)
+        return self._convert_packages(json)
+
+    # Polls the list of packages and yields the packages whose status or counters have changed since the previous poll
+    # (every package on the first poll if initial is True); the ETag and Last-Modified response headers are sent back
+    # as conditional request headers, the response is not parsed again if its body has not changed, and the polling interval
+    # grows by the backoff factor up to max_interval while nothing changes and returns to interval after a change
+    def watch_packages(self, interval=30, max_interval=300, backoff=2.0, initial=True):
+        states = {}
+        validators = {}
+        digest = None
+        delay = interval
+        first = True
+        while True:
+            resp = self._request('GET', '/packages', headers=validators)
+            changed = []
+            if resp.status_code != 304:
+                body_digest = hashlib.sha1(resp.content).digest()
+                if resp.status_code != 200 or body_digest != digest:
+                    json = self._handle_response(resp)
+                    digest = body_digest
+                    validators = {}
+                    if resp.headers.get('ETag'):
+                        validators['If-None-Match'] = resp.headers['ETag']
+                    if resp.headers.get('Last-Modified'):
+                        validators['If-Modified-Since'] = resp.headers['Last-Modified']
+                    current = {}
+                    for package in json['packages']:
+                        state = (package.get('status'), package.get('completed_num'), package.get('pictures_num'), package.get('amount'))
+                        current[package.get('id')] = state
+                        if states.get(package.get('id')) != state:
+                            changed.append(package)
+                    states = current
+            if first and not initial:
+                changed = []
+            first = False
+
+            for package in changed:
+                yield self._created_to_datetime(package)
+
+            delay = interval if changed else min(delay * backoff, max_interval)
+            time.sleep(delay)
+
+    # Creates a new TAGIAS package for annotation
+    @instrumented('create_package')
+    def create_package(self, name, type, descr, labels, callback, baseurl, pictures, labels_required = None):
+        data = self._package_data(name, type, descr, labels, callback, baseurl, pictures, labels_required)
+        resp = self._request('POST', '/packages', json=data)
+        json = self._handle_response(resp)
+        return self._convert_new_package(json)
+
+    # Splits the pictures (a list or any iterable, which is read lazily) into chunks of chunk_size pictures and creates
+    # a separate package named '<name> #<chunk number>' for every chunk in a bounded thread pool; returns the report with
+    # the 'created' list of {'chunk', 'id', 'pictures_num'} dicts and the 'failed' list of {'chunk', 'pictures', 'error'} dicts
+    # that can be retried, both ordered by the chunk number
+    def create_packages_chunked(self, name, type, descr, labels, callback, baseurl, pictures, labels_required = None,
+                                chunk_size=10000, max_workers=None):
+        max_workers = max_workers or self.pool_size
+        iterator = iter(pictures)
+        created = []
+        failed = []
+
+        def create(index, chunk):
+            try:
+                package = self.create_package('{} #{}'.format(name, index + 1), type, descr, labels, callback, baseurl, chunk, labels_required)
+            except TagiasError as e:
+                failed.append({'chunk': index, 'pictures': chunk, 'error': e})
+            except requests.RequestException:
+                failed.append({'chunk': index, 'pictures': chunk, 'error': TagiasError(TagiasErrors.CONNECTION)})
+            except Exception as e:
+                # any other failure (e.g. pictures that cannot be serialized) is reported too, so every chunk is
+                # either created or failed
+                error = TagiasError(TagiasErrors.UNKNOWN)
+                error.__cause__ = e
+                failed.append({'chunk': index, 'pictures': chunk, 'error': error})
+            else:
+                created.append({'chunk': index, 'id': package['id'], 'pictures_num': package['pictures_num']})
+
+        # at most two chunks per worker are read ahead, so a generator of pictures is never materialized as a whole
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = set()
+            for index in itertools.count():
+                chunk = list(itertools.islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                if len(pending) >= 2 * max_workers:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                pending.add(executor.submit(create, index, chunk))
+
+        created.sort(key=lambda x: x['chunk'])
+        failed.sort(key=lambda x: x['chunk'])
+        return {'created': created, 'failed': failed}
+
+    # Modifies the TAGIAS package's status
+    @instrumented('set_package_status')
+    def set_package_status(self, id, status):
+        resp = self._request('PATCH', '/packages/' + id, json={'status': status})
+        self._handle_response(resp)
+        return
+
+    # Reads the TAGIAS package's properties
+    @instrumented('get_package')
+    def get_package(self, id):
+        resp = self._request('GET', '/packages/' + id)
+        json = self._handle_response(resp)
+        return self._convert_package(json)
+
     # Requests the tagias.com server to send currently available annotations for all completed images from the specified package to the package's callback endpoint
+    @instrumented('request_result')
     def request_result(self, id):
-        resp = requests.post(self._TAGIAS_URL + '/packages/result/' + id, headers=self.headers)
+        # requesting the result again only repeats the delivery to the callback, so it is safe to retry
+        resp = self._request('POST', '/packages/result/' + id, idempotent=True)
         self._handle_response(resp)
         return
 
     # Reads the currently available annotations for all completed images from the specified package
+    @instrumented('get_result')
     def get_result(self, id):
-        resp = requests.get(self._TAGIAS_URL + '/packages/result/' + id, headers=self.headers)
-        json = self._handle_response(resp)
-        json['finished'] = self._to_datetime(json['finished'])
-        json.pop('status', None)
+        if self.cache is None:
+            json = self._get_result_json(id)
+        else:
+            json = self._get_cached_result_json(id)
+        return self._convert_result(json)
+
+    # Reads the not converted result of the package
+    def _get_result_json(self, id):
+        resp = self._request('GET', '/packages/result/' + id)
+        return self._handle_response(resp)
+
+    # Reads the not converted result of the package through the cache; the cached result is valid while the package's
+    # 'updated' and 'finished' attributes stay the same, and the results of finished packages are returned without any request
+    def _get_cached_result_json(self, id):
+        entry = self.cache.lookup(id)
+        if entry is not None and entry.get('final'):
+            version = entry['version']
+            final = True
+        else:
+            package = self._handle_response(self._request('GET', '/packages/' + id))['package']
+            version = '{}|{}'.format(package.get('updated'), package.get('finished'))
+            final = package.get('status') == TagiasStatuses.FINISHED
+        json = self.cache.get(id, version)
+        if json is None:
+            json = self._get_result_json(id)
+            self.cache.put(id, version, json, final)
         return json
 
+    # Reads the annotations of the specified package as a stream and yields the pictures one at a time
+    # without loading the whole result; the other result attributes are stored to the optional header dict
+    # (its 'finished' attribute is converted to datetime once the stream is fully read)
+    def iter_result(self, id, header=None, chunk_size=65536):
+        if header is None:
+            header = {}
+        with self._request('GET', '/packages/result/' + id, stream=True) as resp:
+            if resp.status_code != 200:
+                self._check_response(resp.status_code, None)
+            chunks = resp.iter_content(chunk_size)
+            if self.compression is not None:
+                sizes = []
+                chunks = _counted(chunks, sizes)
+            try:
+                for picture in iter_json_array(chunks, 'pictures', header):
+                    yield picture
+            except ValueError:
+                raise TagiasError(TagiasErrors.UNKNOWN)
+            if self.compression is not None:
+                decoded = sum(sizes)
+                self.compression.add_response(decoded, _wire_bytes(resp, decoded))
+        self._check_response(200, header)
+        self._convert_result(header)
+
     # Reads the current balance amount and the list of all operations
+    @instrumented('get_balance')
     def get_balance(self):
-        resp = requests.get(self._TAGIAS_URL + '/balance', headers=self.headers)
+        resp = self._request('GET', '/balance')
         json = self._handle_response(resp)
-        json['operations'] = list(map(self._date_to_datetime, json['operations']))
-        json.pop('status', None)
-        return json
+        return self._convert_balance(json)
+
+    # Reads the properties of the specified packages concurrently and yields (id, package) pairs as they complete;
+    # the package is replaced by a TagiasError for the ids that could not be read
+    def get_packages_details(self, ids, max_workers=None):
+        return self._fetch_many(self.get_package, ids, max_workers)
+
+    # Reads the results of the specified packages concurrently and yields (id, result) pairs as they complete;
+    # the result is replaced by a TagiasError for the ids that could not be read
+    def get_results_many(self, ids, max_workers=None):
+        return self._fetch_many(self.get_result, ids, max_workers)
 
 
 # TAGIAS Package class
 class TagiasPackage:
+    __slots__ = ('id', 'name', 'type', 'status', 'created', 'amount', 'pictures_num', 'completed_num')
+
     def __init__(self, package):
         self.id = package.get('id')
         self.name = package.get('name')
@@ -200,13 +621,44 @@ class TagiasPackage:
 
 # TAGIAS NewPackage class
 class TagiasNewPackage:
+    __slots__ = ('id', 'pictures_num')
+
     def __init__(self, package):
         self.id = package.get('id')
         self.pictures_num = package.get('pictures_num')
 
 
+# TAGIAS Chunk class for a package created from a chunk of pictures (id and pictures_num are set)
+# or for a chunk that failed (pictures and error are set)
+class TagiasChunk:
+    __slots__ = ('chunk', 'id', 'pictures_num', 'pictures', 'error')
+
+    def __init__(self, chunk):
+        self.chunk = chunk.get('chunk')
+        self.id = chunk.get('id')
+        self.pictures_num = chunk.get('pictures_num')
+        self.pictures = chunk.get('pictures')
+        self.error = chunk.get('error')
+
+
+# TAGIAS ChunkedPackages class
+class TagiasChunkedPackages:
+    __slots__ = ('created', 'failed')
+
+    def __init__(self, report):
+        self.created = list(map(lambda x: TagiasChunk(x), report.get('created')))
+        self.failed = list(map(lambda x: TagiasChunk(x), report.get('failed')))
+
+    # Returns the pictures of all failed chunks to retry them
+    def failed_pictures(self):
+        return [picture for chunk in self.failed for picture in chunk.pictures]
+
+
 # TAGIAS FullPackage class
 class TagiasFullPackage:
+    __slots__ = ('id', 'name', 'type', 'status', 'descr', 'labels', 'labels_required', 'callback', 'created', 'started',
+                 'stopped', 'finished', 'updated', 'delivered', 'baseurl', 'amount', 'pictures_num', 'completed_num')
+
     def __init__(self, package):
         self.id = package.get('id')
         self.name = package.get('name')
@@ -228,33 +680,86 @@ class TagiasFullPackage:
         self.completed_num = package.get('completed_num')
 
 
+# Shared tuples of the key orders of the source JSON objects of the shapes
+_KEY_ORDERS = {}
+
+# Keys of the source JSON points of the lines and polygons that are rebuilt from the TagiasPoint instances
+_POINT_KEYS = ('x', 'y')
+
+# Keys of the classes that have the label attribute only
+_SHAPE_KEYS = frozenset(('type', 'label'))
+
+# Keys of the lines and the polygons
+_POINTS_KEYS = frozenset(('type', 'label', 'points'))
+
+
+# Base class for the annotation shapes; the source JSON object is kept in _data if keep_raw is True or if it has keys
+# the shape class does not know, otherwise only the order of its keys is kept (in a tuple shared by the shapes with
+# the same keys), and __repr__ and __str__ rebuild the object from the attributes in that order
+class _TagiasShape:
+    __slots__ = ('_data', '_keys')
+
+    # Keeps the source JSON object, or the order of its keys if all of them are in known
+    def _keep(self, data, keep_raw, known):
+        keys = tuple(data)
+        if keep_raw or not known.issuperset(keys):
+            self._data = data
+            self._keys = None
+        else:
+            self._data = None
+            self._keys = _KEY_ORDERS.setdefault(keys, keys)
+
+    # Returns the value of the source JSON key rebuilt from the attributes
+    def _value(self, key):
+        if key == 'points':
+            return [{'x': p.x, 'y': p.y} for p in self.points]
+        if key == 'type':
+            return self._TYPE
+        return getattr(self, key)
+
+    def _raw(self):
+        if self._data is not None:
+            return self._data
+        return {key: self._value(key) for key in self._keys}
+
+    def __repr__(self):
+        return ("{}({!r})".format(self.__class__.__name__, self._raw()))
+
+    def __str__(self):
+        return str(self._raw())
+
+
 # TAGIAS BoundingBox class
-class TagiasBoundingBox:
-    def __init__(self, data):
+class TagiasBoundingBox(_TagiasShape):
+    __slots__ = ('label', 'x', 'y', 'width', 'height', 'x1', 'y1', 'x2', 'y2')
+    _TYPE = TagiasTypes.BoundingBoxes
+    _XYWH_KEYS = frozenset(('type', 'label', 'x', 'y', 'width', 'height'))
+    _XYXY_KEYS = frozenset(('type', 'label', 'x1', 'y1', 'x2', 'y2'))
+
+    def __init__(self, data, keep_raw=False):
         if data.get('type') != TagiasTypes.BoundingBoxes:
             raise TagiasError(TagiasErrors.BADRESULTTYPE)
-        self._data = data
         self.label = data.get('label')
         if 'x' in data:
             self.x = data.get('x')
             self.y = data.get('y')
             self.width = data.get('width')
             self.height = data.get('height')
+            self._keep(data, keep_raw, self._XYWH_KEYS)
         elif 'x1' in data:
             self.x1 = data.get('x1')
             self.y1 = data.get('y1')
             self.x2 = data.get('x2')
             self.y2 = data.get('y2')
-
-    def __repr__(self):
-        return ("{}({!r})".format(self.__class__.__name__, self._data))
-
-    def __str__(self):
-        return str(self._data)
+            self._keep(data, keep_raw, self._XYXY_KEYS)
+        else:
+            self._keep(data, keep_raw, _SHAPE_KEYS)
 
 
 # TAGIAS Point class
 class TagiasPoint:
+    __slots__ = ('x', 'y')
+
     def __init__(self, data):
         self.x = data.get('x')
         self.y = data.get('y')
@@ -266,87 +771,84 @@ class TagiasPoint:
         return ("({}, {})".format(self.x, self.y))
 
 
+# Converts the source JSON points and keeps the source object of the line or polygon if the points cannot be rebuilt
+# from the TagiasPoint instances as they are
+def _keep_points(shape, data, keep_raw):
+    points = data.get('points')
+    shape.points = list(map(lambda x: TagiasPoint(x), points))
+    if not keep_raw and any(tuple(p) != _POINT_KEYS for p in points):
+        keep_raw = True
+    shape._keep(data, keep_raw, _POINTS_KEYS)
+
+
 # TAGIAS Line class
-class TagiasLine:
-    def __init__(self, data):
+class TagiasLine(_TagiasShape):
+    __slots__ = ('label', 'points')
+    _TYPE = TagiasTypes.Lines
+
+    def __init__(self, data, keep_raw=False):
         if data.get('type') != TagiasTypes.Lines:
             raise TagiasError(TagiasErrors.BADRESULTTYPE)
-        self._data = data
         self.label = data.get('label')
-        self.points = list(map(lambda x: TagiasPoint(x), data.get('points')))
-
-    def __repr__(self):
-        return ("{}({!r})".format(self.__class__.__name__, self._data))
-
-    def __str__(self):
-        return str(self._data)
+        _keep_points(self, data, keep_raw)
 
 
 # TAGIAS Poligon class
-class TagiasPoligon:
-    def __init__(self, data):
+class TagiasPoligon(_TagiasShape):
+    __slots__ = ('label', 'points')
+    _TYPE = TagiasTypes.Polygons
+
+    def __init__(self, data, keep_raw=False):
         if data.get('type') != TagiasTypes.Polygons:
             raise TagiasError(TagiasErrors.BADRESULTTYPE)
-        self._data = data
         self.label = data.get('label')
-        self.points = list(map(lambda x: TagiasPoint(x), data.get('points')))
-
-    def __repr__(self):
-        return ("{}({!r})".format(self.__class__.__name__, self._data))
-
-    def __str__(self):
-        return str(self._data)
+        _keep_points(self, data, keep_raw)
 
 
 # TAGIAS Keypoints class
-class TagiasKeypoint:
-    def __init__(self, data):
+class TagiasKeypoint(_TagiasShape):
+    __slots__ = ('label', 'x', 'y')
+    _TYPE = TagiasTypes.Keypoints
+    _KEYS = frozenset(('type', 'label', 'x', 'y'))
+
+    def __init__(self, data, keep_raw=False):
         if data.get('type') != TagiasTypes.Keypoints:
             raise TagiasError(TagiasErrors.BADRESULTTYPE)
-        self._data = data
         self.label = data.get('label')
         self.x = data.get('x')
         self.y = data.get('y')
-
-    def __repr__(self):
-        return ("{}({!r})".format(self.__class__.__name__, self._data))
-
-    def __str__(self):
-        return str(self._data)
+        self._keep(data, keep_raw, self._KEYS)
 
 
 # TAGIAS ClassificationSingle class
-class TagiasClassificationSingle:
-    def __init__(self, data):
+class TagiasClassificationSingle(_TagiasShape):
+    __slots__ = ('label',)
+    _TYPE = TagiasTypes.ClassificationSingle
+
+    def __init__(self, data, keep_raw=False):
         if data.get('type') != TagiasTypes.ClassificationSingle:
             raise TagiasError(TagiasErrors.BADRESULTTYPE)
-        self._data = data
         self.label = data.get('label')
-
-    def __repr__(self):
-        return ("{}({!r})".format(self.__class__.__name__, self._data))
-
-    def __str__(self):
-        return str(self._data)
+        self._keep(data, keep_raw, _SHAPE_KEYS)
 
 
 # TAGIAS ClassificationMultiple class
-class TagiasClassificationMultiple:
-    def __init__(self, data):
+class TagiasClassificationMultiple(_TagiasShape):
+    __slots__ = ('labels',)
+    _TYPE = TagiasTypes.ClassificationMultiple
+    _KEYS = frozenset(('type', 'labels'))
+
+    def __init__(self, data, keep_raw=False):
         if data.get('type') != TagiasTypes.ClassificationMultiple:
             raise TagiasError(TagiasErrors.BADRESULTTYPE)
-        self._data = data
         self.labels = data.get('labels')
-
-    def __repr__(self):
-        return ("{}({!r})".format(self.__class__.__name__, self._data))
-
-    def __str__(self):
-        return str(self._data)
+        self._keep(data, keep_raw, self._KEYS)
 
 
 # TAGIAS ResultError class
 class TagiasResultError:
+    __slots__ = ('error',)
+
     def __init__(self, data):
         self.error = data.get('error')
 
@@ -357,36 +859,141 @@ class TagiasResultError:
         return ("ERROR {}".format(self.error))
 
 
+# Marker for the not yet converted items of the lazy lists and attributes; it is pickled as a reference
+# to the module attribute, so it is still the same object after unpickling
+class _NotConverted:
+    __slots__ = ()
+
+    def __reduce__(self):
+        return '_NOT_CONVERTED'
+
+
+_NOT_CONVERTED = _NotConverted()
+
+
+# List that converts the items of the source list with the factory function on first access; the converted items
+# are kept for subsequent accesses unless cache is False. The list methods that modify it (append, insert, sort,
+# item assignment and deletion...) convert all remaining items first, and the list then holds the converted items only
+class TagiasLazyList(MutableSequence):
+    __slots__ = ('_source', '_factory', '_items')
+
+    # factory is None if the source items are converted already
+    def __init__(self, source, factory, cache=True):
+        self._source = source
+        self._factory = factory
+        if factory is None:
+            self._items = source
+        else:
+            self._items = [_NOT_CONVERTED] * len(source) if cache else None
+
+    # Converts all remaining items and returns the list of the converted items
+    def _materialize(self):
+        if self._factory is not None:
+            self._items = [self[i] for i in range(len(self._source))]
+            self._source = self._items
+            self._factory = None
+        return self._items
+
+    def __len__(self):
+        return len(self._source)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._source)))]
+        if self._items is None:
+            return self._factory(self._source[index])
+        item = self._items[index]
+        if item is _NOT_CONVERTED:
+            item = self._items[index] = self._factory(self._source[index])
+        return item
+
+    def __setitem__(self, index, value):
+        self._materialize()[index] = value
+
+    def __delitem__(self, index):
+        del self._materialize()[index]
+
+    def insert(self, index, value):
+        self._materialize().insert(index, value)
+
+    def sort(self, key=None, reverse=False):
+        self._materialize().sort(key=key, reverse=reverse)
+
+    def copy(self):
+        return list(self)
+
+    def __iter__(self):
+        for i in range(len(self._source)):
+            yield self[i]
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, TagiasLazyList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 # TAGIAS PictureResult class
 class TagiasPictureResult:
-    def __init__(self, picture):
+    __slots__ = ('_picture', 'name', 'result', '_cache', '_keep_raw', '_datalist', '_converted_data')
+
+    # The datalist (for a list of shapes) or data (for a classification or an error) attribute is converted on first access;
+    # the shapes keep a reference to their source JSON objects only if keep_raw is True
+    def __init__(self, picture, cache=True, keep_raw=False):
         self._picture = picture
         self.name = picture.get('name')
         self.result = picture.get('result')
+        self._cache = cache
+        self._keep_raw = keep_raw
+        self._datalist = None
+        self._converted_data = _NOT_CONVERTED
+
+    @property
+    def datalist(self):
+        if not isinstance(self.result, list):
+            raise AttributeError("'{}' object has no attribute 'datalist'".format(self.__class__.__name__))
+        if self._datalist is None:
+            self._datalist = TagiasLazyList(self.result, self._convert_to_datalist, self._cache)
+        return self._datalist
+
+    @property
+    def data(self):
         if isinstance(self.result, list):
-            self.datalist = list(map(self._convert_to_datalist, self.result))
-        else:
-            self.data = self._convert_to_data(self.result)
+            raise AttributeError("'{}' object has no attribute 'data'".format(self.__class__.__name__))
+        data = self._converted_data
+        if data is _NOT_CONVERTED:
+            data = self._convert_to_data(self.result)
+            if self._cache:
+                self._converted_data = data
+        return data
 
     def _convert_to_datalist(self, result):
         resulttype = result.get('type')
         if resulttype == TagiasTypes.BoundingBoxes:
-            return TagiasBoundingBox(result)
+            return TagiasBoundingBox(result, self._keep_raw)
         elif resulttype == TagiasTypes.Lines:
-            return TagiasLine(result)
+            return TagiasLine(result, self._keep_raw)
         elif resulttype == TagiasTypes.Polygons:
-            return TagiasPoligon(result)
+            return TagiasPoligon(result, self._keep_raw)
         elif resulttype == TagiasTypes.Keypoints:
-            return TagiasKeypoint(result)
+            return TagiasKeypoint(result, self._keep_raw)
         else:
             return None
 
     def _convert_to_data(self, result):
         resulttype = result.get('type')
         if resulttype == TagiasTypes.ClassificationSingle:
-            return TagiasClassificationSingle(result)
+            return TagiasClassificationSingle(result, self._keep_raw)
         elif resulttype == TagiasTypes.ClassificationMultiple:
-            return TagiasClassificationMultiple(result)
+            return TagiasClassificationMultiple(result, self._keep_raw)
         elif 'error' in result:
             return TagiasResultError(result)
         else:
@@ -401,12 +1008,26 @@ class TagiasPictureResult:
 
 # TAGIAS Result class
 class TagiasResult:
-    def __init__(self, result):
+    __slots__ = ('_result', 'id', 'finished', 'baseurl', 'pictures')
+
+    # The pictures are converted to TagiasPictureResult instances on first access
+    def __init__(self, result, cache=True, keep_raw=False):
         self._result = result
         self.id = result.get('id')
         self.finished = result.get('finished')
         self.baseurl = result.get('baseurl')
-        self.pictures = list(map(lambda x: TagiasPictureResult(x), result.get('pictures')))
+        self.pictures = TagiasLazyList(result.get('pictures'), functools.partial(TagiasPictureResult, cache=cache, keep_raw=keep_raw),
+                                       cache)
+
+    # Converts the result to NumPy arrays per annotation type (see tagias.columnar.TagiasColumns); requires numpy
+    def to_columns(self):
+        from .columnar import to_columns
+        return to_columns(self)
+
+    # Builds the index of the pictures by name, label, annotation type and error (see tagias.index.TagiasResultIndex)
+    def index(self):
+        from .index import TagiasResultIndex
+        return TagiasResultIndex(self)
 
     def __repr__(self):
         return ("{}({!r})".format(self.__class__.__name__, self._result))
@@ -417,6 +1038,8 @@ class TagiasResult:
 
 # TAGIAS Operation class
 class TagiasOperation:
+    __slots__ = ('_operation', 'date', 'amount', 'note')
+
     def __init__(self, operation):
         self._operation = operation
         self.date = operation.get('date')
@@ -432,6 +1055,8 @@ class TagiasOperation:
 
 # TAGIAS Balance class
 class TagiasBalance:
+    __slots__ = ('_balance', 'balance', 'operations')
+
     def __init__(self, balance):
         self._balance = balance
         self.balance = balance.get('balance')
@@ -446,41 +1071,105 @@ class TagiasBalance:
 
 # TAGIAS helper class
 class TagiasHelper2:
-    # Saves an instance of the TagiasHelper class
-    def __init__(self, apiKey):
-        self.helper = TagiasHelper(apiKey)
+    # Saves an instance of the TagiasHelper class; the session options are passed to TagiasHelper;
+    # keep_raw makes the result shapes keep references to their source JSON objects
+    def __init__(self, apiKey, keep_raw=False, **kwargs):
+        self.helper = TagiasHelper(apiKey, **kwargs)
+        self.keep_raw = keep_raw
+
+    # The listeners of the underlying TagiasHelper also receive the calls of this class, including the conversion time
+    @property
+    def _listeners(self):
+        return self.helper._listeners
+
+    # Adds the listener that receives a tagias.metrics.TagiasCallEvent after every method call
+    def add_listener(self, listener):
+        self.helper.add_listener(listener)
+
+    # Removes the listener
+    def remove_listener(self, listener):
+        self.helper.remove_listener(listener)
+
+    # Closes the pooled connections of the underlying TagiasHelper
+    def close(self):
+        self.helper.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     # Returns the array of created packages
+    @instrumented('get_packages')
     def get_packages(self):
         packages = self.helper.get_packages()
         return list(map(lambda x: TagiasPackage(x), packages))
 
+    # Polls the list of packages and yields TagiasPackage instances for the packages whose status or counters have changed
+    # (see TagiasHelper.watch_packages)
+    def watch_packages(self, interval=30, max_interval=300, backoff=2.0, initial=True):
+        for package in self.helper.watch_packages(interval, max_interval, backoff, initial):
+            yield TagiasPackage(package)
+
     # Creates a new TAGIAS package for annotation
+    @instrumented('create_package')
     def create_package(self, name, type, descr, labels, callback, baseurl, pictures):
         package = self.helper.create_package(name, type, descr, labels, callback, baseurl, pictures)
         return TagiasNewPackage(package)
 
+    # Creates a separate package for every chunk of chunk_size pictures in a bounded thread pool
+    # (see TagiasHelper.create_packages_chunked) and returns the TagiasChunkedPackages report
+    def create_packages_chunked(self, name, type, descr, labels, callback, baseurl, pictures, labels_required = None,
+                                chunk_size=10000, max_workers=None):
+        report = self.helper.create_packages_chunked(name, type, descr, labels, callback, baseurl, pictures, labels_required,
+                                                     chunk_size, max_workers)
+        return TagiasChunkedPackages(report)
+
     # Modifies the TAGIAS package's status
+    @instrumented('set_package_status')
     def set_package_status(self, id, status):
         self.helper.set_package_status(id, status)
         return
 
     # Reads the TAGIAS package's properties
+    @instrumented('get_package')
     def get_package(self, id):
         package = self.helper.get_package(id)
         return TagiasFullPackage(package)
 
     # Requests the tagias.com server to send currently available annotations for all completed images from the specified package to the package's callback endpoint
+    @instrumented('request_result')
     def request_result(self, id):
         self.helper.request_result(id)
         return
 
     # Reads the currently available annotations for all completed images from the specified package
+    @instrumented('get_result')
     def get_result(self, id):
         result = self.helper.get_result(id)
-        return TagiasResult(result)
+        return TagiasResult(result, keep_raw=self.keep_raw)
+
+    # Reads the annotations of the specified package as a stream and yields TagiasPictureResult instances one at a time
+    # without loading the whole result; the other result attributes are stored to the optional header dict
+    def iter_result(self, id, header=None, chunk_size=65536):
+        for picture in self.helper.iter_result(id, header, chunk_size):
+            yield TagiasPictureResult(picture, keep_raw=self.keep_raw)
 
     # Reads the current balance amount and the list of all operations
+    @instrumented('get_balance')
     def get_balance(self):
         balance = self.helper.get_balance()
         return TagiasBalance(balance)
+
+    # Reads the properties of the specified packages concurrently and yields (id, TagiasFullPackage) pairs as they complete;
+    # the package is replaced by a TagiasError for the ids that could not be read
+    def get_packages_details(self, ids, max_workers=None):
+        for id, package in self.helper.get_packages_details(ids, max_workers):
+            yield id, package if isinstance(package, TagiasError) else TagiasFullPackage(package)
+
+    # Reads the results of the specified packages concurrently and yields (id, TagiasResult) pairs as they complete;
+    # the result is replaced by a TagiasError for the ids that could not be read
+    def get_results_many(self, ids, max_workers=None):
+        for id, result in self.helper.get_results_many(ids, max_workers):
+            yield id, result if isinstance(result, TagiasError) else TagiasResult(result, keep_raw=self.keep_raw)
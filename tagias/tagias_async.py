@@ -0,0 +1,238 @@
+import asyncio
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .tagias import _TagiasHelperBase, TagiasPackage, TagiasNewPackage, TagiasFullPackage, TagiasResult, TagiasBalance
+from .metrics import instrumented, current_event
+
+
+# TAGIAS asyncio helper class
+class AsyncTagiasHelper(_TagiasHelperBase):
+    # Saves the provided API key and the settings of the shared connection pool; the aiohttp session
+    # is created on the first request, so the helper can be constructed outside of a running event loop
+    def __init__(self, apiKey, pool_size=10, max_concurrency=None, keep_alive=True, timeout=None, session=None,
+                 retry=True, rate_limiter=None, timestamps='naive', json_codec=None, url=None, listeners=None):
+        if aiohttp is None:
+            raise ImportError('AsyncTagiasHelper requires the aiohttp package (pip install tagias[async])')
+        super().__init__(apiKey, retry, rate_limiter, timestamps, json_codec, url, listeners)
+        self.pool_size = pool_size
+        # the number of requests that may be in flight at the same time, defaults to the pool size
+        self.max_concurrency = max_concurrency or pool_size
+        self.keep_alive = keep_alive
+        # timeout is either a number of seconds or a (connect, read) tuple applied to every request
+        self.timeout = timeout
+
+        # the session is closed by close() only if it was created by the helper itself
+        self._owns_session = session is None
+        self.session = session
+        self._semaphore = None
+
+    # Returns the aiohttp session, creating the pooled connector on the first call
+    def _get_session(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, force_close=not self.keep_alive)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self._client_timeout())
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    # Converts the timeout setting to the aiohttp.ClientTimeout instance
+    def _client_timeout(self):
+        if self.timeout is None:
+            return aiohttp.ClientTimeout(total=None)
+        if isinstance(self.timeout, tuple):
+            return aiohttp.ClientTimeout(total=None, sock_connect=self.timeout[0], sock_read=self.timeout[1])
+        return aiohttp.ClientTimeout(total=self.timeout)
+
+    # Closes the pooled connections of the owned aiohttp session
+    async def close(self):
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    # Sends the HTTP request to the specified TAGIAS API path and returns the verified JSON response; the json body is
+    # encoded with the helper's codec, and the request waits for the rate limiter and is retried according to the retry policy
+    # the same way as in TagiasHelper
+    async def _request(self, method, path, idempotent=None, json=None, **kwargs):
+        session = self._get_session()
+        if json is not None:
+            kwargs['data'] = self.codec.dumps(json)
+        if idempotent is None:
+            idempotent = method in self._IDEMPOTENT_METHODS
+        event = current_event()
+        attempt = 0
+        while True:
+            queued = time.perf_counter()
+            if self.rate_limiter is not None:
+                delay = self.rate_limiter.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            async with self._semaphore:
+                started = time.perf_counter()
+                if event is not None:
+                    event.timings['queue'] += started - queued
+                try:
+                    async with session.request(method, self._TAGIAS_URL + path, headers=self.headers, **kwargs) as resp:
+                        if self.retry is None or resp.status < 400 or not self.retry.is_retryable(resp.status, idempotent, attempt):
+                            if resp.status != 200:
+                                self._record_request(event, method, path, kwargs, resp.status, b'', started, None)
+                                return self._check_response(resp.status, None)
+                            headers_received = time.perf_counter()
+                            body = await resp.read()
+                            self._record_request(event, method, path, kwargs, resp.status, body, started, headers_received)
+                            if event is None:
+                                return self._check_response(200, self.codec.loads(body))
+                            decoding = time.perf_counter()
+                            json = self.codec.loads(body)
+                            event.timings['decode'] += time.perf_counter() - decoding
+                            return self._check_response(200, json)
+                        self._record_request(event, method, path, kwargs, resp.status, b'', started, None)
+                        delay = self.retry.delay(attempt, resp.headers.get('Retry-After'))
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    # a request that failed while connecting has never been sent, so it is safe to retry in any case
+                    if self.retry is None or not self.retry.is_retryable(None, idempotent or isinstance(e, aiohttp.ClientConnectorError), attempt):
+                        raise
+                    delay = self.retry.delay(attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+            if event is not None:
+                event.timings['queue'] += delay
+
+    # Adds the request to the instrumented call: the time until the response headers are received is the 'network' phase
+    # and the time to read the body is the 'transfer' phase
+    def _record_request(self, event, method, path, kwargs, status, body, started, headers_received):
+        if event is None:
+            return
+        now = time.perf_counter()
+        if headers_received is None:
+            headers_received = now
+        data = kwargs.get('data')
+        event.add_request(method, path, status, len(data) if data is not None else 0, len(body),
+                          headers_received - started, now - headers_received)
+
+    # Returns the array of created packages
+    @instrumented('get_packages')
+    async def get_packages(self):
+        json = await self._request('GET', '/packages')
+        return self._convert_packages(json)
+
+    # Creates a new TAGIAS package for annotation
+    @instrumented('create_package')
+    async def create_package(self, name, type, descr, labels, callback, baseurl, pictures, labels_required = None):
+        data = self._package_data(name, type, descr, labels, callback, baseurl, pictures, labels_required)
+        json = await self._request('POST', '/packages', json=data)
+        return self._convert_new_package(json)
+
+    # Modifies the TAGIAS package's status
+    @instrumented('set_package_status')
+    async def set_package_status(self, id, status):
+        await self._request('PATCH', '/packages/' + id, json={'status': status})
+        return
+
+    # Reads the TAGIAS package's properties
+    @instrumented('get_package')
+    async def get_package(self, id):
+        json = await self._request('GET', '/packages/' + id)
+        return self._convert_package(json)
+
+    # Requests the tagias.com server to send currently available annotations for all completed images from the specified package to the package's callback endpoint
+    @instrumented('request_result')
+    async def request_result(self, id):
+        await self._request('POST', '/packages/result/' + id, idempotent=True)
+        return
+
+    # Reads the currently available annotations for all completed images from the specified package
+    @instrumented('get_result')
+    async def get_result(self, id):
+        json = await self._request('GET', '/packages/result/' + id)
+        return self._convert_result(json)
+
+    # Reads the current balance amount and the list of all operations
+    @instrumented('get_balance')
+    async def get_balance(self):
+        json = await self._request('GET', '/balance')
+        return self._convert_balance(json)
+
+
+# TAGIAS asyncio helper class that returns class instances
+class AsyncTagiasHelper2:
+    # Saves an instance of the AsyncTagiasHelper class; the session options are passed to AsyncTagiasHelper;
+    # keep_raw makes the result shapes keep references to their source JSON objects
+    def __init__(self, apiKey, keep_raw=False, **kwargs):
+        self.helper = AsyncTagiasHelper(apiKey, **kwargs)
+        self.keep_raw = keep_raw
+
+    # The listeners of the underlying AsyncTagiasHelper also receive the calls of this class, including the conversion time
+    @property
+    def _listeners(self):
+        return self.helper._listeners
+
+    # Adds the listener that receives a tagias.metrics.TagiasCallEvent after every method call
+    def add_listener(self, listener):
+        self.helper.add_listener(listener)
+
+    # Removes the listener
+    def remove_listener(self, listener):
+        self.helper.remove_listener(listener)
+
+    # Closes the pooled connections of the underlying AsyncTagiasHelper
+    async def close(self):
+        await self.helper.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    # Returns the array of created packages
+    @instrumented('get_packages')
+    async def get_packages(self):
+        packages = await self.helper.get_packages()
+        return list(map(lambda x: TagiasPackage(x), packages))
+
+    # Creates a new TAGIAS package for annotation
+    @instrumented('create_package')
+    async def create_package(self, name, type, descr, labels, callback, baseurl, pictures, labels_required = None):
+        package = await self.helper.create_package(name, type, descr, labels, callback, baseurl, pictures, labels_required)
+        return TagiasNewPackage(package)
+
+    # Modifies the TAGIAS package's status
+    @instrumented('set_package_status')
+    async def set_package_status(self, id, status):
+        await self.helper.set_package_status(id, status)
+        return
+
+    # Reads the TAGIAS package's properties
+    @instrumented('get_package')
+    async def get_package(self, id):
+        package = await self.helper.get_package(id)
+        return TagiasFullPackage(package)
+
+    # Requests the tagias.com server to send currently available annotations for all completed images from the specified package to the package's callback endpoint
+    @instrumented('request_result')
+    async def request_result(self, id):
+        await self.helper.request_result(id)
+        return
+
+    # Reads the currently available annotations for all completed images from the specified package
+    @instrumented('get_result')
+    async def get_result(self, id):
+        result = await self.helper.get_result(id)
+        return TagiasResult(result, keep_raw=self.keep_raw)
+
+    # Reads the current balance amount and the list of all operations
+    @instrumented('get_balance')
+    async def get_balance(self):
+        balance = await self.helper.get_balance()
+        return TagiasBalance(balance)
@@ -0,0 +1,55 @@
+import json
+import threading
+import unittest
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import requests
+
+from tagias.callback import TagiasCallbackApp, _ThreadingWSGIServer
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class TagiasCallbackAppTest(unittest.TestCase):
+    def setUp(self):
+        self.results = []
+        self.app = TagiasCallbackApp(self.results.append, workers=1, batch_size=2)
+        self.server = make_server('127.0.0.1', 0, self.app, server_class=_ThreadingWSGIServer,
+                                  handler_class=_QuietHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.app.close()
+
+    def test_empty_post_is_rejected(self):
+        resp = requests.post(self.url, data=b'', timeout=5)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.results, [])
+
+    def test_invalid_body_is_rejected(self):
+        resp = requests.post(self.url, data=b'{"pictures": [', timeout=5)
+        self.assertEqual(resp.status_code, 400)
+
+    def test_get_is_not_allowed(self):
+        resp = requests.get(self.url, timeout=5)
+        self.assertEqual(resp.status_code, 405)
+
+    def test_pictures_are_batched(self):
+        body = {'status': 'ok', 'finished': '2020-01-02T03:04:05.000Z',
+                'pictures': [{'name': str(i), 'result': {'type': 'ClassificationSingle', 'label': 'a'}} for i in range(5)]}
+        resp = requests.post(self.url, data=json.dumps(body), timeout=5)
+        self.assertEqual(resp.status_code, 200)
+        self.app.join()
+        self.assertEqual([len(result.pictures) for result in self.results], [2, 2, 1])
+        self.assertEqual([p.name for result in self.results for p in result.pictures], ['0', '1', '2', '3', '4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
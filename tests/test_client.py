@@ -0,0 +1,139 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from mock_server import MockTagiasServer
+from tagias.retry import TagiasRetry
+from tagias.tagias import TagiasHelper, TagiasError, TagiasErrors, TagiasStatuses
+
+
+PACKAGE_ID = '{:024x}'.format(0)
+
+
+# Tests of the TagiasHelper request paths against the local mock TAGIAS server
+class TagiasHelperMockTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockTagiasServer(packages=5, pictures=120, shapes=3, points=4, log_requests=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests.clear()
+        del self.server.failures[:]
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _helper(self, **options):
+        options.setdefault('retry', TagiasRetry(total=3, backoff_factor=0, jitter=False))
+        return TagiasHelper('key', url=self.server.url, **options)
+
+    def _paths(self):
+        return [(method, path) for method, path, _ in self.server.requests]
+
+    def test_retry_on_server_errors(self):
+        self.server.fail(503, count=2, path='/packages')
+        with self._helper() as helper:
+            self.assertEqual(len(helper.get_packages()), 5)
+        self.assertEqual(self._paths(), [('GET', '/packages')] * 3)
+
+    def test_retries_are_limited(self):
+        self.server.fail(500, count=10, path='/balance')
+        with self._helper() as helper:
+            with self.assertRaises(TagiasError) as context:
+                helper.get_balance()
+        self.assertEqual(context.exception.code, '500')
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_create_is_retried_only_when_throttled(self):
+        self.server.fail(429, method='POST', retry_after=0)
+        with self._helper() as helper:
+            self.assertEqual(helper.create_package('a', 'Keypoints', 'd', None, None, None, ['a.jpg'])['pictures_num'], 120)
+            self.assertEqual(len(self.server.requests), 2)
+
+            self.server.fail(503, method='POST')
+            with self.assertRaises(TagiasError):
+                helper.create_package('a', 'Keypoints', 'd', None, None, None, ['a.jpg'])
+            self.assertEqual(len(self.server.requests), 3)
+
+    def test_no_retry(self):
+        self.server.fail(503, path='/packages')
+        with self._helper(retry=False) as helper:
+            with self.assertRaises(TagiasError):
+                helper.get_packages()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_result_cache(self):
+        self.server.update_package(status=TagiasStatuses.ACTIVE, updated='2020-07-02T10:00:00.000Z', finished=None)
+        with self._helper(cache=os.path.join(self.dir, 'cache')) as helper:
+            first = helper.get_result(PACKAGE_ID)
+            self.assertEqual(helper.get_result(PACKAGE_ID), first)
+            # the second call only checks the package version
+            self.assertEqual([path for _, path in self._paths()], [
+                '/packages/' + PACKAGE_ID, '/packages/result/' + PACKAGE_ID, '/packages/' + PACKAGE_ID])
+
+            self.server.requests.clear()
+            self.server.update_package(updated='2020-07-03T10:00:00.000Z')
+            helper.get_result(PACKAGE_ID)
+            self.assertEqual([path for _, path in self._paths()], [
+                '/packages/' + PACKAGE_ID, '/packages/result/' + PACKAGE_ID])
+
+            # the result of a finished package is not checked anymore once it is cached
+            self.server.update_package(status=TagiasStatuses.FINISHED, finished='2020-07-04T10:00:00.000Z')
+            helper.get_result(PACKAGE_ID)
+            self.server.requests.clear()
+            self.assertEqual(helper.get_result(PACKAGE_ID), first)
+            self.assertEqual(self.server.requests, [])
+
+    def test_iter_result(self):
+        with self._helper() as helper:
+            result = helper.get_result(PACKAGE_ID)
+            header = {}
+            pictures = list(helper.iter_result(PACKAGE_ID, header, chunk_size=257))
+        self.assertEqual(len(pictures), 120)
+        self.assertEqual(pictures, result['pictures'])
+        self.assertEqual(header['id'], result['id'])
+        self.assertEqual(header['finished'], result['finished'])
+
+    def test_iter_result_error(self):
+        self.server.fail(404, path='/packages/result/')
+        with self._helper() as helper:
+            with self.assertRaises(TagiasError):
+                list(helper.iter_result(PACKAGE_ID))
+
+    def test_create_packages_chunked(self):
+        self.server.fail(503, method='POST', contains='chunked #2')
+        pictures = ('{}.jpg'.format(n) for n in range(25))
+        with self._helper() as helper:
+            report = helper.create_packages_chunked('chunked', 'Keypoints', 'd', None, None, None, pictures,
+                                                    chunk_size=10, max_workers=2)
+        self.assertEqual([chunk['chunk'] for chunk in report['created']], [0, 2])
+        self.assertEqual([chunk['chunk'] for chunk in report['failed']], [1])
+        self.assertEqual(report['failed'][0]['pictures'], ['{}.jpg'.format(n) for n in range(10, 20)])
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_get_results_many(self):
+        self.server.fail(404, path='/packages/result/b')
+        with self._helper() as helper:
+            results = dict(helper.get_results_many(['a', 'b', 'c'], max_workers=3))
+        self.assertEqual(sorted(results), ['a', 'b', 'c'])
+        self.assertIsInstance(results['b'], TagiasError)
+        self.assertEqual(len(results['a']['pictures']), 120)
+
+    def test_connection_error(self):
+        with TagiasHelper('key', url='http://127.0.0.1:9/api', retry=False) as helper:
+            results = dict(helper.get_packages_details(['a']))
+        self.assertEqual(results['a'].code, TagiasErrors.CONNECTION)
+
+
+if __name__ == '__main__':
+    unittest.main()
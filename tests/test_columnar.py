@@ -0,0 +1,57 @@
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from tagias.columnar import TagiasColumns, to_columns
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class ToColumnsTest(unittest.TestCase):
+    RESULT = {'pictures': [
+        {'name': '1.jpg', 'result': [
+            {'type': 'BoundingBoxes', 'label': 'dog', 'x': 1, 'y': 2, 'width': 3, 'height': 4},
+            {'type': 'BoundingBoxes', 'label': '', 'x1': 1, 'y1': 2, 'x2': 3, 'y2': 4},
+            {'type': 'BoundingBoxes', 'x1': 5, 'y1': 6, 'x2': 7, 'y2': 8},
+            {'type': 'Polygons', 'label': 'cat', 'points': [{'x': 1, 'y': 2}, {'x': 3, 'y': 4}, {'x': 5, 'y': 6}]},
+            {'type': 'Keypoints', 'label': None, 'x': 9, 'y': 10},
+        ]},
+        {'name': '2.jpg', 'result': {'type': 'ClassificationSingle', 'label': ''}},
+        {'name': '3.jpg', 'result': {'type': 'ClassificationMultiple', 'labels': ['dog', 'cat']}},
+        {'name': '4.jpg', 'result': {'error': 'BADIMAGE'}},
+        {'name': '5.jpg', 'result': None},
+    ]}
+
+    def test_columns(self):
+        columns = to_columns(self.RESULT)
+        self.assertEqual(columns.labels, ['', 'cat', 'dog'])
+        self.assertEqual(columns.box_label.tolist(), [2, 0, -1])
+        self.assertEqual(columns.boxes.tolist(), [[1, 2, 4, 6], [1, 2, 3, 4], [5, 6, 7, 8]])
+        self.assertEqual(columns.box_picture.tolist(), [0, 0, 0])
+        self.assertEqual(columns.polygon_points.tolist(), [[1, 2], [3, 4], [5, 6]])
+        self.assertEqual(columns.polygon_offsets.tolist(), [0, 3])
+        self.assertEqual(columns.polygon_label.tolist(), [1])
+        self.assertEqual(columns.line_points.shape, (0, 2))
+        self.assertEqual(columns.keypoints.tolist(), [[9, 10]])
+        self.assertEqual(columns.keypoint_label.tolist(), [-1])
+        self.assertEqual(columns.class_picture.tolist(), [1])
+        self.assertEqual(columns.class_label.tolist(), [0])
+        self.assertEqual(columns.multi_offsets.tolist(), [0, 2])
+        self.assertEqual(columns.multi_labels.tolist(), [2, 1])
+        self.assertEqual(columns.error_picture.tolist(), [3])
+        self.assertEqual(repr(columns), 'TagiasColumns(pictures=5, boxes=3, lines=0, polygons=1, keypoints=1, labels=3)')
+
+    def test_no_labels(self):
+        columns = to_columns({'pictures': [{'name': '1.jpg', 'result': [{'type': 'Keypoints', 'x': 1, 'y': 2}]}]})
+        self.assertEqual(columns.labels, [])
+        self.assertEqual(columns.keypoint_label.tolist(), [-1])
+        self.assertEqual(to_columns({'pictures': []}).labels, [])
+
+    def test_unfilled_repr(self):
+        self.assertEqual(repr(TagiasColumns()), 'TagiasColumns()')
+
+
+if __name__ == '__main__':
+    unittest.main()
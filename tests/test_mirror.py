@@ -0,0 +1,143 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from tagias.mirror import TagiasMirror
+from tagias.codec import get_codec
+
+
+# In-memory stand-in for TagiasHelper with the methods used by the mirror
+class _FakeHelper:
+    def __init__(self):
+        self.codec = get_codec()
+        self.packages = {
+            'a': {'id': 'a', 'name': 'A', 'type': 'BoundingBoxes', 'status': 'ACTIVE', 'created': '2020-07-01T10:00:00.000Z',
+                  'amount': 1.0, 'pictures_num': 2, 'completed_num': 2, 'descr': 'first', 'updated': '2020-07-02T10:00:00.000Z'},
+            'b': {'id': 'b', 'name': 'B', 'type': 'ClassificationSingle', 'status': 'FINISHED',
+                  'created': '2020-07-01T10:00:00.000Z', 'amount': 1.0, 'pictures_num': 1, 'completed_num': 1,
+                  'descr': 'second', 'updated': '2020-07-02T10:00:00.000Z'},
+        }
+        self.pictures = {
+            'a': [{'name': '1.jpg', 'result': [{'type': 'BoundingBoxes', 'label': 'dog', 'x1': 1, 'y1': 2, 'x2': 3, 'y2': 4}]},
+                  {'name': '2.jpg', 'result': []}],
+            'b': [{'name': '1.jpg', 'result': {'type': 'ClassificationSingle', 'label': 'cat'}}],
+        }
+        self.details = []
+        # called with the package id while its result is being downloaded
+        self.during_download = None
+
+    def get_packages(self):
+        return [{key: package[key] for key in ('id', 'name', 'type', 'status', 'created', 'amount', 'pictures_num',
+                                               'completed_num')} for package in self.packages.values()]
+
+    def get_packages_details(self, ids, max_workers=None):
+        self.details.extend(ids)
+        return [(id, dict(self.packages[id])) for id in ids]
+
+    def get_result(self, id):
+        return {'id': id, 'pictures': list(self.iter_result(id))}
+
+    def iter_result(self, id):
+        for n, picture in enumerate(self.pictures[id]):
+            if n == 1 and self.during_download is not None:
+                self.during_download(id)
+            yield picture
+
+    def get_balance(self):
+        return {'balance': 10.0, 'operations': []}
+
+
+class TagiasMirrorTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tagias.db')
+        self.helper = _FakeHelper()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_sync(self):
+        with TagiasMirror(self.helper, self.path) as mirror:
+            stats = mirror.sync()
+            self.assertEqual((stats['details'], stats['results'], stats['pictures'], stats['shapes']), (2, 2, 3, 1))
+            self.assertEqual(mirror.query('SELECT label, x1, y2 FROM shapes'), [('dog', 1.0, 4.0)])
+            self.assertEqual(mirror.query("SELECT label FROM pictures WHERE package_id = 'b'"), [('cat',)])
+
+            # nothing has changed
+            stats = mirror.sync()
+            self.assertEqual((stats['details'], stats['results']), (0, 0))
+
+    def test_list_changes(self):
+        with TagiasMirror(self.helper, self.path) as mirror:
+            mirror.sync()
+            del self.helper.details[:]
+            self.helper.packages['b']['name'] = 'B2'
+            self.assertEqual(mirror.sync()['details'], 1)
+            self.assertEqual(self.helper.details, ['b'])
+            self.assertEqual(mirror.query("SELECT name FROM packages WHERE id = 'b'"), [('B2',)])
+
+    def test_unfinished_details_are_refreshed(self):
+        with TagiasMirror(self.helper, self.path, refresh_interval=0) as mirror:
+            mirror.sync()
+            del self.helper.details[:]
+            # the edit of the description does not show in the list of packages
+            self.helper.packages['a']['descr'] = 'edited'
+            self.helper.packages['b']['descr'] = 'edited'
+            mirror.sync()
+            self.assertEqual(self.helper.details, ['a'])
+            self.assertEqual(mirror.query('SELECT id, descr FROM packages ORDER BY id'), [('a', 'edited'), ('b', 'second')])
+
+        del self.helper.details[:]
+        with TagiasMirror(self.helper, self.path, refresh_interval=None) as mirror:
+            mirror.sync()
+        self.assertEqual(self.helper.details, [])
+
+    def test_download_does_not_lock_the_mirror(self):
+        for stream in (False, True):
+            path = os.path.join(self.dir, 'stream.db' if stream else 'result.db')
+            with TagiasMirror(self.helper, path, stream=stream, batch_size=1) as mirror:
+                seen = []
+
+                def during_download(id):
+                    # another connection writes to the mirror and still sees the previous result
+                    other = sqlite3.connect(path, timeout=0)
+                    try:
+                        with other:
+                            other.execute("INSERT INTO meta VALUES ('other', ?)", (id,))
+                        seen.append(other.execute('SELECT COUNT(*) FROM pictures WHERE package_id = ?', (id,)).fetchone()[0])
+                    finally:
+                        other.close()
+
+                mirror.sync(['a'])
+                self.helper.during_download = during_download
+                self.helper.packages['a']['completed_num'] = 1
+                self.helper.pictures['a'] = self.helper.pictures['a'][:1] + [{'name': '3.jpg', 'result': []}]
+                try:
+                    self.assertEqual(mirror.sync(['a'])['results'], 1)
+                finally:
+                    self.helper.during_download = None
+                self.assertEqual(seen, [2])
+                self.assertEqual(mirror.query("SELECT name FROM pictures WHERE package_id = 'a' ORDER BY name"),
+                                 [('1.jpg',), ('3.jpg',)])
+                self.helper.packages['a']['completed_num'] = 2
+
+    def test_failed_download_keeps_the_previous_result(self):
+        with TagiasMirror(self.helper, self.path, stream=True, batch_size=1) as mirror:
+            mirror.sync(['a'])
+
+            def during_download(id):
+                raise OSError('connection lost')
+
+            self.helper.during_download = during_download
+            self.helper.packages['a']['completed_num'] = 1
+            with self.assertRaises(OSError):
+                mirror.sync(['a'])
+            self.assertEqual(mirror.query("SELECT COUNT(*) FROM pictures WHERE package_id = 'a'"), [(2,)])
+            self.assertEqual(mirror.query('SELECT COUNT(*) FROM temp.stage_pictures'), [(0,)])
+            self.assertEqual(mirror.query("SELECT result_completed_num FROM packages WHERE id = 'a'"), [(2,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tagias.orchestrator import TagiasOrchestrator
+from tagias.tagias import TagiasError, TagiasErrors, TagiasStatuses
+
+
+# In-memory stand-in for TagiasHelper with the methods used by the orchestrator
+class _FakeHelper:
+    codec = None
+
+    def __init__(self, status=TagiasStatuses.FINISHED, fail_create=()):
+        self.packages = []
+        self.status = status
+        self.fail_create = set(fail_create)
+        self.creates = 0
+
+    def get_packages(self):
+        return [dict(package) for package in self.packages]
+
+    def create_package(self, name, type, descr, labels, callback, baseurl, pictures, labels_required=None):
+        self.creates += 1
+        if self.creates in self.fail_create:
+            raise TagiasError(TagiasErrors.INTERNAL)
+        package = {'id': 'p{}'.format(self.creates), 'name': name}
+        self.packages.append(package)
+        return {'id': package['id'], 'pictures_num': len(pictures)}
+
+    def set_package_status(self, id, status):
+        pass
+
+    def get_package(self, id):
+        return {'id': id, 'status': self.status, 'completed_num': 1, 'pictures_num': 1}
+
+    def iter_result(self, id):
+        return iter([])
+
+
+class TagiasOrchestratorTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'jobs.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _orchestrator(self, helper, **options):
+        return TagiasOrchestrator(helper, self.path, min_interval=0.01, max_interval=0.05, **options)
+
+    def _submit(self, orchestrator, name):
+        return orchestrator.submit(name, 'Keypoints', 'descr', None, None, 'https://example.com/', ['a.jpg'])
+
+    def test_jobs_with_the_same_name_get_their_own_packages(self):
+        # the second create request fails, and its retry must not take the package of the first job
+        helper = _FakeHelper(fail_create=[2])
+        with self._orchestrator(helper) as orchestrator:
+            first = self._submit(orchestrator, 'daily')
+            second = self._submit(orchestrator, 'daily')
+            self.assertEqual(orchestrator.run(), {'done': 2})
+            packages = {orchestrator.job(first)['package_id'], orchestrator.job(second)['package_id']}
+        self.assertEqual(len(packages), 2)
+
+    def test_interrupted_creation_is_recovered(self):
+        helper = _FakeHelper()
+        with self._orchestrator(helper) as orchestrator:
+            job_id = self._submit(orchestrator, 'daily')
+            # the package was created but the process stopped before the job was saved
+            helper.create_package(orchestrator.package_name(job_id, 'daily'), 'Keypoints', '', None, None, None, ['a.jpg'])
+            orchestrator.connection.execute("UPDATE jobs SET state = 'creating' WHERE id = ?", (job_id,))
+            orchestrator.connection.commit()
+            self.assertEqual(orchestrator.run(), {'done': 1})
+            self.assertEqual(orchestrator.job(job_id)['package_id'], 'p1')
+        self.assertEqual(helper.creates, 1)
+
+    def test_unexpected_error_fails_only_the_job(self):
+        helper = _FakeHelper()
+        helper.iter_result = lambda id: (_ for _ in ()).throw(OSError('disk full')) if id == 'p1' else iter([])
+        with self._orchestrator(helper, harvest_dir=self.dir) as orchestrator:
+            first = self._submit(orchestrator, 'a')
+            second = self._submit(orchestrator, 'b')
+            self.assertEqual(orchestrator.run(), {'done': 1, 'failed': 1})
+            self.assertEqual(orchestrator.job(first)['state'], 'failed')
+            self.assertEqual(orchestrator.job(second)['state'], 'done')
+
+    def test_stopped_package_is_paused(self):
+        helper = _FakeHelper(status=TagiasStatuses.STOPPED)
+        with self._orchestrator(helper) as orchestrator:
+            job_id = orchestrator.track('p1')
+            self.assertEqual(orchestrator.run(), {'paused': 1})
+            # the paused job is checked again by the next run and continues once the package is finished
+            helper.status = TagiasStatuses.FINISHED
+            self.assertEqual(orchestrator.run(), {'done': 1})
+            self.assertEqual(orchestrator.job(job_id)['state'], 'done')
+
+    def test_track_returns_the_existing_job(self):
+        with self._orchestrator(_FakeHelper()) as orchestrator:
+            job_id = orchestrator.track('p1', job_id='first')
+            self.assertEqual(orchestrator.track('p1', job_id='second'), job_id)
+            self.assertEqual(orchestrator.track('p1'), job_id)
+            self.assertEqual(len(orchestrator.jobs()), 1)
+            with self.assertRaises(ValueError):
+                orchestrator.track('p2', job_id='first')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from tagias.preflight import TagiasPictureValidator, validate_pictures
+
+
+# Local picture server: /ok.jpg answers HEAD, /nohead.jpg answers only the range GET, /page.html is not a picture,
+# /slow.jpg takes a while to answer and the other paths are missing
+class _PictureHandler(BaseHTTPRequestHandler):
+    def _reply(self, status, content_type='image/jpeg', body=b''):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _serve(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path, self.headers.get('Range')))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path == '/slow.jpg' or self.path.startswith('/slow/'):
+                time.sleep(0.1)
+                self._reply(200)
+            elif self.path == '/ok.jpg':
+                self._reply(200)
+            elif self.path == '/nohead.jpg':
+                if self.command == 'HEAD':
+                    self._reply(405, 'text/plain')
+                else:
+                    self._reply(206, body=b'x')
+            elif self.path == '/page.html':
+                self._reply(200, 'text/html')
+            else:
+                self._reply(404, 'text/plain')
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    do_HEAD = _serve
+    do_GET = _serve
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _PictureServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _PictureHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+
+
+class TagiasPictureValidatorTest(unittest.TestCase):
+    def setUp(self):
+        self.server = _PictureServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.baseurl = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_head(self):
+        with TagiasPictureValidator() as validator:
+            self.assertIsNone(validator.check(self.baseurl + 'ok.jpg'))
+        self.assertEqual(self.server.requests, [('HEAD', '/ok.jpg', None)])
+
+    def test_range_get_fallback(self):
+        with TagiasPictureValidator() as validator:
+            self.assertIsNone(validator.check(self.baseurl + 'nohead.jpg'))
+        self.assertEqual(self.server.requests, [('HEAD', '/nohead.jpg', None), ('GET', '/nohead.jpg', 'bytes=0-0')])
+
+    def test_bad_pictures(self):
+        pictures = ['ok.jpg', 'missing.jpg', 'page.html', 'nohead.jpg', 'ftp://example.com/a.jpg', 'ok.jpg']
+        bad = validate_pictures(self.baseurl, pictures)
+        self.assertEqual([(b['picture'], b['error']) for b in bad], [
+            ('missing.jpg', 'HTTP 404'),
+            ('page.html', 'unexpected content type text/html'),
+            ('ftp://example.com/a.jpg', 'malformed URL'),
+        ])
+        # the duplicate picture is checked once
+        self.assertEqual(sum(1 for request in self.server.requests if request[1] == '/ok.jpg'), 1)
+
+    def test_any_content_type(self):
+        self.assertEqual(validate_pictures(self.baseurl, ['page.html'], content_types=None), [])
+
+    def test_per_host_limit(self):
+        pictures = ['slow/{}.jpg'.format(i) for i in range(12)]
+        with TagiasPictureValidator(max_workers=12, per_host=3) as validator:
+            self.assertEqual(validator.validate(self.baseurl, pictures), [])
+        self.assertEqual(len(self.server.requests), 12)
+        self.assertLessEqual(self.server.max_active, 3)
+
+    def test_cache(self):
+        with TagiasPictureValidator(ttl=60, error_ttl=0) as validator:
+            self.assertIsNone(validator.check(self.baseurl + 'ok.jpg'))
+            self.assertIsNone(validator.check(self.baseurl + 'ok.jpg'))
+            # the errors expire at once with error_ttl=0
+            self.assertEqual(validator.check(self.baseurl + 'missing.jpg'), 'HTTP 404')
+            self.assertEqual(validator.check(self.baseurl + 'missing.jpg'), 'HTTP 404')
+            self.assertEqual([request[1] for request in self.server.requests], ['/ok.jpg', '/missing.jpg', '/missing.jpg'])
+
+            validator.clear(expired_only=True)
+            self.assertIsNone(validator.check(self.baseurl + 'ok.jpg'))
+            self.assertEqual(len(self.server.requests), 3)
+            validator.clear()
+            self.assertIsNone(validator.check(self.baseurl + 'ok.jpg'))
+            self.assertEqual(len(self.server.requests), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
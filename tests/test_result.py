@@ -0,0 +1,119 @@
+import pickle
+import unittest
+
+from tagias.tagias import (TagiasResult, TagiasPictureResult, TagiasLazyList, TagiasTypes, TagiasBoundingBox, TagiasLine,
+                           TagiasPoligon, TagiasKeypoint, TagiasClassificationSingle, TagiasClassificationMultiple)
+
+
+def _result():
+    return {
+        'id': 'p1',
+        'finished': None,
+        'baseurl': 'https://example.com/',
+        'pictures': [
+            {'name': 'a.jpg', 'result': [
+                {'type': TagiasTypes.BoundingBoxes, 'label': 'car', 'x': 1, 'y': 2, 'width': 3, 'height': 4},
+                {'x': 5, 'y': 6, 'type': TagiasTypes.Keypoints, 'label': 'eye'},
+            ]},
+            {'name': 'b.jpg', 'result': {'type': TagiasTypes.ClassificationSingle, 'label': 'cat'}},
+            {'name': 'c.jpg', 'result': {'error': 'NOTFOUND'}},
+        ],
+    }
+
+
+class TagiasLazyListTest(unittest.TestCase):
+    def test_items_are_converted_on_access(self):
+        calls = []
+        items = TagiasLazyList([1, 2, 3], lambda x: calls.append(x) or x * 10)
+        self.assertEqual(items[1], 20)
+        self.assertEqual(calls, [2])
+        self.assertEqual(items[1], 20)
+        self.assertEqual(calls, [2])
+        self.assertEqual(list(items), [10, 20, 30])
+        self.assertEqual(items[::2], [10, 30])
+
+    def test_items_are_converted_again_without_cache(self):
+        calls = []
+        items = TagiasLazyList([1], lambda x: calls.append(x) or x, cache=False)
+        items[0]
+        items[0]
+        self.assertEqual(calls, [1, 1])
+
+    def test_list_methods(self):
+        items = TagiasLazyList([3, 1, 2], lambda x: x * 10)
+        items.append(0)
+        items.sort()
+        self.assertEqual(items, [0, 10, 20, 30])
+        items[0] = 5
+        del items[1]
+        items.insert(0, 1)
+        items += [7]
+        self.assertEqual(items, [1, 5, 20, 30, 7])
+        self.assertEqual(items + [8], [1, 5, 20, 30, 7, 8])
+        self.assertEqual(items.pop(), 7)
+        self.assertEqual(items.index(20), 2)
+        self.assertIsInstance(items.copy(), list)
+
+
+class TagiasResultTest(unittest.TestCase):
+    def test_pictures(self):
+        result = TagiasResult(_result())
+        self.assertEqual([p.name for p in result.pictures], ['a.jpg', 'b.jpg', 'c.jpg'])
+        self.assertEqual(result.pictures[0].datalist[0].width, 3)
+        self.assertEqual(result.pictures[1].data.label, 'cat')
+        self.assertEqual(result.pictures[2].data.error, 'NOTFOUND')
+
+    def test_pickle(self):
+        for cache in (True, False):
+            result = TagiasResult(_result(), cache=cache)
+            # converts some of the items before pickling
+            result.pictures[0].datalist[1]
+            result.pictures[1].data
+            copy = pickle.loads(pickle.dumps(result))
+            self.assertEqual(repr(copy), repr(result))
+            self.assertEqual(copy.pictures[0].datalist[0].label, 'car')
+            self.assertEqual(copy.pictures[0].datalist[1].label, 'eye')
+            self.assertEqual(copy.pictures[1].data.label, 'cat')
+            self.assertEqual(copy.pictures[2].data.error, 'NOTFOUND')
+
+    def test_pickle_modified_pictures(self):
+        result = TagiasResult(_result())
+        result.pictures.reverse()
+        copy = pickle.loads(pickle.dumps(result))
+        self.assertEqual([p.name for p in copy.pictures], ['c.jpg', 'b.jpg', 'a.jpg'])
+
+    def test_picture_repr(self):
+        picture = _result()['pictures'][1]
+        self.assertEqual(repr(TagiasPictureResult(picture)), 'TagiasPictureResult({!r})'.format(picture))
+
+
+class TagiasShapeTest(unittest.TestCase):
+    SHAPES = [
+        (TagiasBoundingBox, {'type': TagiasTypes.BoundingBoxes, 'label': 'car', 'x': 1, 'y': 2, 'width': 3, 'height': 4}),
+        (TagiasBoundingBox, {'x1': 1, 'y1': 2, 'x2': 3, 'y2': 4, 'label': None, 'type': TagiasTypes.BoundingBoxes}),
+        (TagiasBoundingBox, {'type': TagiasTypes.BoundingBoxes, 'label': 'car', 'x': 1, 'y': 2, 'width': 3, 'height': 4,
+                             'score': 0.5}),
+        (TagiasLine, {'label': 'road', 'type': TagiasTypes.Lines, 'points': [{'x': 1, 'y': 2}, {'x': 3, 'y': 4}]}),
+        (TagiasLine, {'type': TagiasTypes.Lines, 'label': 'road', 'points': [{'y': 2, 'x': 1}]}),
+        (TagiasPoligon, {'type': TagiasTypes.Polygons, 'label': 'roof', 'points': [{'x': 1, 'y': 2, 'z': 0}]}),
+        (TagiasKeypoint, {'x': 5, 'y': 6, 'type': TagiasTypes.Keypoints, 'label': 'eye'}),
+        (TagiasClassificationSingle, {'label': 'cat', 'type': TagiasTypes.ClassificationSingle}),
+        (TagiasClassificationMultiple, {'type': TagiasTypes.ClassificationMultiple, 'labels': ['a', 'b'], 'extra': 1}),
+    ]
+
+    def test_repr_matches_source(self):
+        for cls, data in self.SHAPES:
+            for keep_raw in (False, True):
+                shape = cls(data, keep_raw)
+                self.assertEqual(repr(shape), '{}({!r})'.format(cls.__name__, data))
+                self.assertEqual(str(shape), str(data))
+
+    def test_source_is_not_kept(self):
+        shape = TagiasKeypoint({'x': 5, 'y': 6, 'type': TagiasTypes.Keypoints, 'label': 'eye'})
+        self.assertIsNone(shape._data)
+        other = TagiasKeypoint({'x': 7, 'y': 8, 'type': TagiasTypes.Keypoints, 'label': 'nose'})
+        self.assertIs(shape._keys, other._keys)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import unittest
+
+from tagias.stream import iter_json_array
+
+
+# Splits the data into chunks of the given size
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    DOCUMENT = {
+        'status': 'ok',
+        'id': 12345678901234567890,
+        'pictures': [
+            {'name': 'café "1".jpg', 'result': [{'type': 'Polygons', 'label': 'a\\b',
+                                                      'points': [{'x': 1.5, 'y': -2e-3}]}]},
+            {'name': '2.jpg', 'result': {'error': 'BADIMAGE'}},
+            1234567,
+            True,
+            None,
+            '}]',
+        ],
+        'finished': '2020-07-13T10:15:30.123Z',
+        'empty': [],
+    }
+
+    def test_any_chunk_boundaries(self):
+        data = json.dumps(self.DOCUMENT, indent=1).encode('utf-8')
+        for size in range(1, 40):
+            header = {}
+            self.assertEqual(list(iter_json_array(_chunks(data, size), 'pictures', header)), self.DOCUMENT['pictures'])
+            self.assertEqual(header, {key: value for key, value in self.DOCUMENT.items() if key != 'pictures'})
+
+    def test_str_chunks_and_loads(self):
+        data = json.dumps(self.DOCUMENT)
+        items = list(iter_json_array(_chunks(data, 7), 'pictures', {}, loads=lambda text: ('loaded', json.loads(text))))
+        self.assertEqual(items, [('loaded', item) for item in self.DOCUMENT['pictures']])
+
+    def test_large_value(self):
+        picture = {'name': 'big.jpg', 'result': [{'type': 'Keypoints', 'x': n, 'y': n} for n in range(20000)]}
+        data = json.dumps({'pictures': [picture, picture]}).encode('utf-8')
+        self.assertEqual(list(iter_json_array(_chunks(data, 100), 'pictures', {})), [picture, picture])
+
+    def test_invalid(self):
+        for data in (b'', b'[]', b'{"pictures": [1, 2', b'{"pictures": [1, x]}', b'{"pictures": [{"a": 1}'):
+            with self.assertRaises(ValueError, msg=data):
+                list(iter_json_array(_chunks(data, 3), 'pictures', {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+import unittest
+
+from tagias.sync import TagiasResultSync
+
+
+# In-memory stand-in for TagiasHelper with the methods used by the sync
+class _FakeHelper:
+    def __init__(self, pictures):
+        self.pictures = pictures
+        self.package = {'completed_num': len(pictures), 'updated': '2020-07-01T10:00:00.000Z'}
+        self.downloads = 0
+
+    def get_package(self, id):
+        return dict(self.package)
+
+    def iter_result(self, id):
+        self.downloads += 1
+        for picture in self.pictures:
+            yield dict(picture)
+
+
+def _pictures(count):
+    return [{'name': '{}.jpg'.format(n), 'result': {'type': 'ClassificationMultiple', 'labels': ['a', str(n)]}}
+            for n in range(count)]
+
+
+class TagiasResultSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_only_new_and_changed_pictures(self):
+        helper = _FakeHelper(_pictures(3))
+        sync = TagiasResultSync(helper, self.dir)
+        self.assertEqual([p.name for p in sync.sync('p')], ['0.jpg', '1.jpg', '2.jpg'])
+
+        # nothing has changed, so the result is not downloaded
+        self.assertEqual(sync.sync_all('p'), [])
+        self.assertTrue(sync.last_stats['skipped'])
+        self.assertEqual(helper.downloads, 1)
+
+        helper.pictures = _pictures(4)
+        helper.pictures[0]['result']['labels'] = ['b']
+        helper.package = {'completed_num': 4, 'updated': '2020-07-02T10:00:00.000Z'}
+        self.assertEqual([p.name for p in sync.sync('p')], ['0.jpg', '3.jpg'])
+        self.assertEqual(sync.last_stats, {'new': 1, 'changed': 1, 'unchanged': 2, 'skipped': False})
+
+    def test_state_does_not_depend_on_the_codec(self):
+        helper = _FakeHelper(_pictures(3))
+        self.assertEqual(len(TagiasResultSync(helper, self.dir, codec='json').sync_all('p')), 3)
+        try:
+            import orjson  # noqa: F401
+        except ImportError:
+            codec = 'json'
+        else:
+            codec = 'orjson'
+        self.assertEqual(TagiasResultSync(helper, self.dir, codec=codec).sync_all('p', force=True), [])
+
+    def test_interrupted_sync_keeps_its_progress(self):
+        helper = _FakeHelper(_pictures(5))
+        sync = TagiasResultSync(helper, self.dir, checkpoint=0)
+        pictures = sync.sync('p')
+        self.assertEqual([next(pictures).name for _ in range(3)], ['0.jpg', '1.jpg', '2.jpg'])
+        pictures.close()
+
+        # the third picture was not remembered, since the next one was not requested
+        self.assertEqual([p.name for p in sync.sync('p')], ['2.jpg', '3.jpg', '4.jpg'])
+        self.assertEqual(helper.downloads, 2)
+
+    def test_failed_download_keeps_its_progress(self):
+        helper = _FakeHelper(_pictures(4))
+        original = helper.iter_result
+
+        def failing(id):
+            for n, picture in enumerate(original(id)):
+                if n == 2:
+                    raise OSError('connection lost')
+                yield picture
+
+        helper.iter_result = failing
+        sync = TagiasResultSync(helper, self.dir, checkpoint=None)
+        names = []
+        with self.assertRaises(OSError):
+            for picture in sync.sync('p'):
+                names.append(picture.name)
+        self.assertEqual(names, ['0.jpg', '1.jpg'])
+
+        helper.iter_result = original
+        self.assertEqual([p.name for p in sync.sync('p')], ['2.jpg', '3.jpg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
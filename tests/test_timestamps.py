@@ -0,0 +1,61 @@
+import datetime
+import unittest
+
+from tagias.tagias import _parse_datetime, _parse_datetime_aware
+
+
+def _strptime(s):
+    return datetime.datetime.strptime(s, '%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+class ParseDatetimeTest(unittest.TestCase):
+    VALID = [
+        '2020-07-13T10:15:30.123Z',
+        '2020-07-13T10:15:30.1Z',
+        '2020-07-13T10:15:30.123456Z',
+        '2020-07-13T00:00:00.000000Z',
+        '2020-02-29T23:59:59.999Z',
+        # not in the fixed positions, decoded by strptime
+        '2020-7-3T1:2:3.4Z',
+    ]
+    INVALID = [
+        '2020-07-13T10:15:30Z',
+        '2020-07-13T10:15:30.Z',
+        '2020-07-13T10:15:30. 12Z',
+        '2020-07-13T10:15:30.+1Z',
+        '2020-07-13T10:15:30.-1Z',
+        '2020-07-13T10:15:30.1234567Z',
+        '2020-07-13T10:15:30,123Z',
+        '2020-07-13 10:15:30.123Z',
+        '2020-07-13T10:15:30.123',
+        ' 202-07-13T10:15:30.123Z',
+        '+020-07-13T10:15:30.123Z',
+        '2020-13-13T10:15:30.123Z',
+        '2019-02-29T10:15:30.123Z',
+        '2020-07-13T24:15:30.123Z',
+        '2020-07-13T10:15:30.12²Z',
+        '',
+    ]
+
+    def test_valid(self):
+        for s in self.VALID:
+            self.assertEqual(_parse_datetime(s), _strptime(s), s)
+
+    def test_invalid(self):
+        for s in self.INVALID:
+            with self.assertRaises(ValueError, msg=s):
+                _strptime(s)
+            with self.assertRaises(ValueError, msg=s):
+                _parse_datetime(s)
+
+    def test_none(self):
+        self.assertIsNone(_parse_datetime(None))
+        self.assertIsNone(_parse_datetime_aware(None))
+
+    def test_aware(self):
+        value = _parse_datetime_aware('2020-07-13T10:15:30.123Z')
+        self.assertEqual(value, datetime.datetime(2020, 7, 13, 10, 15, 30, 123000, datetime.timezone.utc))
+
+
+if __name__ == '__main__':
+    unittest.main()